@@ -0,0 +1,256 @@
+"""
+Benchmarks for the mindoc conversion pipeline.
+
+Generates a synthetic corpus of .py, .sql and .md files, then times each stage of the pipeline
+(get_code, convert_python_blocks, convert_sql_blocks, convert_to_html, create_toc and save_as) over it,
+and reports the throughput in files/s and MB/s and the peak memory.
+It also times converting a file again after a one-line edit (edit_one_line), as watch mode does.
+
+    python benchmarks/bench.py --files 200 --lines 400 --headings 20
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --compare baseline.json --tolerance 0.2
+
+With --compare, the run fails (exit code 1) if any stage got slower than the baseline by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mindoc
+
+
+WORDS = ('customer order product table column value amount date key index query report '
+         'load transform source target daily monthly total count average status region').split()
+
+
+def sentence(rng: random.Random, length: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize() + '.'
+
+
+def heading_title(rng: random.Random, number: int) -> str:
+    return f'{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {number}'
+
+
+def generate_doc_block(rng: random.Random, lines: int, titles: list) -> str:
+    doc = ''
+    for line_number in range(lines):
+        if titles and line_number % max(1, lines // len(titles)) == 0:
+            doc += '\n' + '#' * rng.randint(2, 4) + ' ' + titles.pop(0) + '\n\n'
+        elif rng.random() < 0.1 and doc:
+            doc += '* ' + sentence(rng, 6) + '\n'
+        else:
+            doc += sentence(rng, rng.randint(6, 16)) + '\n'
+    return doc
+
+
+def generate_python(rng: random.Random, lines: int, headings: int) -> str:
+    titles = [heading_title(rng, number) for number in range(headings)]
+    code = '"""\n# ' + sentence(rng, 3) + '\n\n[TOC]\n\nSee [' + titles[0] + '].\n"""\n' if titles else '"""\n# Module\n"""\n'
+    blocks = max(1, headings)
+    for block in range(blocks):
+        code += 'def function_%d(value):\n' % block
+        for line_number in range(lines // (2 * blocks)):
+            code += f'    value = value + {line_number}  # {rng.choice(WORDS)}\n'
+        code += '    return value\n'
+        code += '"""\n' + generate_doc_block(rng, lines // (2 * blocks), titles[block:block + 1]) + '"""\n'
+    return code
+
+
+def generate_sql(rng: random.Random, lines: int, headings: int) -> str:
+    titles = [heading_title(rng, number) for number in range(headings)]
+    code = '/*\n# ' + sentence(rng, 3) + '\n\n[TOC]\n\n' + generate_doc_block(rng, lines // 2, titles) + '*/\n'
+    code += 'SELECT\n'
+    for line_number in range(lines // 2):
+        code += f"    {rng.choice(WORDS)}_{line_number} AS {rng.choice(WORDS)}_{line_number},\n"
+    code += "    'done' AS status\nFROM orders\nWHERE amount > 0;\n"
+    return code
+
+
+def generate_markdown(rng: random.Random, lines: int, headings: int) -> str:
+    titles = [heading_title(rng, number) for number in range(headings)]
+    return '# ' + sentence(rng, 3) + '\n\n[TOC]\n\n' + generate_doc_block(rng, lines, titles)
+
+
+GENERATORS = {'py': generate_python, 'sql': generate_sql, 'md': generate_markdown}
+
+
+def generate_corpus(corpus_dir: str, files: int, lines: int, headings: int, kinds: list, seed: int) -> list:
+    rng = random.Random(seed)
+    code_files = []
+    for file_number in range(files):
+        kind = kinds[file_number % len(kinds)]
+        code_file_path = os.path.join(corpus_dir, f'file_{file_number}.{kind}')
+        mindoc.save_as(GENERATORS[kind](rng, lines, headings), code_file_path)
+        code_files.append(code_file_path)
+    return code_files
+
+
+def convert_blocks(code_file_path: str, code: str) -> str:
+    if code_file_path.endswith('.py'):
+        return mindoc.convert_python_blocks(code)
+    if code_file_path.endswith('.sql'):
+        return mindoc.convert_sql_blocks(code)
+    return code
+
+
+def run_pipeline(code_files: list, output_dir: str) -> dict:
+    timings = {'get_code': 0.0, 'convert_python_blocks': 0.0, 'convert_sql_blocks': 0.0,
+               'convert_to_html': 0.0, 'create_toc': 0.0, 'save_as': 0.0}
+    for code_file_path in code_files:
+        start = time.perf_counter()
+        code = mindoc.get_code(code_file_path)
+        timings['get_code'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        pre_html = convert_blocks(code_file_path, code)
+        stage = 'convert_sql_blocks' if code_file_path.endswith('.sql') else 'convert_python_blocks'
+        if not code_file_path.endswith('.md'):
+            timings[stage] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        html = mindoc.convert_to_html(pre_html)
+        timings['convert_to_html'] += time.perf_counter() - start
+
+        # The table of contents is made as part of convert_to_html, so it is timed again on its own here
+        header_list = mindoc.get_markdown().renderer.header_list
+        start = time.perf_counter()
+        mindoc.create_toc('[TOC]' + html, header_list)
+        timings['create_toc'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        mindoc.save_as(html, os.path.join(output_dir, os.path.basename(code_file_path) + '.html'))
+        timings['save_as'] += time.perf_counter() - start
+    return timings
+
+
+def measure_edit(code_files: list) -> float:
+    # Converts a python file again after a change in one line of its documentation, as watch mode does
+    code_file_path = next(code_file_path for code_file_path in code_files if code_file_path.endswith('.py'))
+    code = mindoc.get_code(code_file_path)
+    mindoc.convert_code(code, code_file_path)
+    mindoc.convert_code(code, code_file_path)
+    
+    lines = code.split('\n')
+    doc_starts = [line_number for (line_number, line) in enumerate(lines) if line == '"""']
+    lines[doc_starts[len(doc_starts) // 2] + 1] += ' Edited.'
+    start = time.perf_counter()
+    mindoc.convert_code('\n'.join(lines), code_file_path)
+    return time.perf_counter() - start
+
+
+def measure_peak_memory(code_files: list) -> int:
+    tracemalloc.start()
+    for code_file_path in code_files:
+        mindoc.convert_to_html(convert_blocks(code_file_path, mindoc.get_code(code_file_path)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark(args) -> dict:
+    corpus_dir = tempfile.mkdtemp(prefix='mindoc-bench-')
+    try:
+        code_files = generate_corpus(corpus_dir, args.files, args.lines, args.headings, args.kinds.split(','), args.seed)
+        total_bytes = sum(os.path.getsize(code_file_path) for code_file_path in code_files)
+
+        # Warm up, then keep the fastest of the repeats for each stage
+        run_pipeline(code_files[:1], corpus_dir)
+        best = None
+        for _ in range(args.repeat):
+            output_dir = tempfile.mkdtemp(dir=corpus_dir)
+            timings = run_pipeline(code_files, output_dir)
+            best = timings if best is None else {stage: min(best[stage], timings[stage]) for stage in best}
+
+        # The whole build, as run by the command line tool
+        for _ in range(args.repeat):
+            # Every repeat converts the files like a new build, without the blocks converted by the one before
+            mindoc.converted_docs.clear()
+            mindoc.rendered_units.clear()
+            start = time.perf_counter()
+            mindoc.make_docs(code_files, print_production=False, jobs=args.jobs)
+            best['make_docs'] = min(best.get('make_docs', float('inf')), time.perf_counter() - start)
+
+        best['edit_one_line'] = min(measure_edit(code_files) for _ in range(args.repeat))
+        
+        return {
+            'corpus': {'files': args.files, 'lines': args.lines, 'headings': args.headings,
+                       'kinds': args.kinds, 'seed': args.seed, 'bytes': total_bytes},
+            'seconds': best,
+            'peak_memory': measure_peak_memory(code_files),
+        }
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+
+def print_report(result: dict):
+    corpus = result['corpus']
+    megabytes = corpus['bytes'] / 1e6
+    print(f"{corpus['files']} files ({corpus['kinds']}), {corpus['lines']} lines and {corpus['headings']} headings each, {megabytes:.2f} MB")
+    print('')
+    print(f"{'stage':<24}{'seconds':>10}{'files/s':>12}{'MB/s':>10}")
+    for stage, seconds in result['seconds'].items():
+        files_per_second = corpus['files'] / seconds if seconds else float('inf')
+        megabytes_per_second = megabytes / seconds if seconds else float('inf')
+        print(f'{stage:<24}{seconds:>10.4f}{files_per_second:>12.1f}{megabytes_per_second:>10.2f}')
+    print('')
+    print(f"peak memory: {result['peak_memory'] / 1e6:.2f} MB")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    if baseline['corpus'] != result['corpus']:
+        print('Warning: the baseline was measured on a different corpus')
+    for stage, seconds in result['seconds'].items():
+        baseline_seconds = baseline['seconds'].get(stage)
+        if baseline_seconds and seconds > baseline_seconds * (1 + tolerance):
+            regressions.append(f'{stage}: {baseline_seconds:.4f}s -> {seconds:.4f}s')
+    if result['peak_memory'] > baseline['peak_memory'] * (1 + tolerance):
+        regressions.append(f"peak memory: {baseline['peak_memory'] / 1e6:.2f} MB -> {result['peak_memory'] / 1e6:.2f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the mindoc conversion pipeline on a synthetic corpus')
+    parser.add_argument('--files', type=int, default=60, help='Number of files in the corpus (default: 60)')
+    parser.add_argument('--lines', type=int, default=400, help='Lines per file (default: 400)')
+    parser.add_argument('--headings', type=int, default=20, help='Headings per file (default: 20)')
+    parser.add_argument('--kinds', default='py,sql,md', help='Comma separated file kinds (default: py,sql,md)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the corpus generator (default: 0)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeats, the fastest is kept (default: 3)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Jobs for the make_docs run (default: 1)')
+    parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    result = benchmark(args)
+    print_report(result)
+
+    if args.save:
+        baseline_file = open(args.save, 'w', encoding='utf-8')
+        json.dump(result, baseline_file, indent=2)
+        baseline_file.close()
+
+    if args.compare:
+        baseline_file = open(args.compare, 'r', encoding='utf-8')
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+        regressions = compare(result, baseline, args.tolerance)
+        print('')
+        if regressions:
+            print('Regressions against the baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Startup benchmarks for the mindoc command line tool.
+
+Measures how long importing mindoc takes (with python -X importtime), and the wall-clock time of
+mindoc --help and of building a single small file, both from scratch and when it is already up to date.
+It also checks that the modules mindoc only imports when they are needed (mistune, http.server, ...)
+are not imported by mindoc --help or by a build where nothing changed.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --save startup.json
+    python benchmarks/startup.py --compare startup.json --tolerance 0.3
+
+With --compare, the run fails (exit code 1) if anything got slower than the baseline by more than the tolerance.
+It always fails if one of the lazily imported modules is imported too early.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+MINDOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mindoc.py')
+
+# Modules that mindoc --help and a build where nothing changed should never import
+LAZY_MODULES = ['mistune', 'http.server', 'socketserver', 'multiprocessing', 'subprocess', 'csv', 'cProfile', 'ctypes']
+
+SMALL_FILE = '''"""
+# Small file
+
+[TOC]
+
+## Part one
+
+Some documentation, see [Part two].
+"""
+def part_one():
+    return 1
+"""
+## Part two
+
+More documentation.
+"""
+def part_two():
+    return 2
+'''
+
+
+def run(arguments: list, cwd: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + arguments, cwd=cwd, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> dict:
+    # Lines look like: import time:       511 |      10584 |   base64
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        (self_us, cumulative_us, name) = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return cumulative
+
+
+def imported_modules(arguments: list, cwd: str) -> dict:
+    return parse_importtime(run(['-X', 'importtime'] + arguments, cwd).stderr)
+
+
+def best_time(arguments: list, cwd: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(arguments, cwd)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='mindoc-startup-')
+    try:
+        code_file = open(os.path.join(work_dir, 'small.py'), 'w', encoding='utf-8')
+        code_file.write(SMALL_FILE)
+        code_file.close()
+        mindoc_dir = os.path.dirname(MINDOC)
+
+        seconds = {
+            'python': best_time(['-c', 'pass'], work_dir, args.repeat),
+            'import mindoc': best_time(['-c', f'import sys; sys.path.insert(0, {mindoc_dir!r}); import mindoc'], work_dir, args.repeat),
+            'mindoc --help': best_time([MINDOC, '--help'], work_dir, args.repeat),
+            'build one file': best_time([MINDOC, '--no-cache', 'small.py'], work_dir, args.repeat),
+            'up to date': best_time([MINDOC, 'small.py'], work_dir, args.repeat),
+        }
+
+        import_times = imported_modules(['-c', f'import sys; sys.path.insert(0, {mindoc_dir!r}); import mindoc'], work_dir)
+        seconds['importtime mindoc'] = import_times.get('mindoc', 0.0)
+
+        leaks = {}
+        for (name, arguments) in [('mindoc --help', [MINDOC, '--help']), ('up to date', [MINDOC, 'small.py'])]:
+            modules = imported_modules(arguments, work_dir)
+            leaked = [module for module in LAZY_MODULES if module in modules]
+            if leaked:
+                leaks[name] = leaked
+
+        return {'seconds': seconds, 'leaks': leaks}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(result: dict):
+    print(f"{'run':<24}{'ms':>10}")
+    for (name, seconds) in result['seconds'].items():
+        print(f'{name:<24}{seconds * 1000:>10.1f}')
+    print('')
+    if result['leaks']:
+        for (name, leaked) in result['leaks'].items():
+            print(f"{name} imports {', '.join(leaked)}")
+    else:
+        print('No lazily imported module was imported too early.')
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for (name, seconds) in result['seconds'].items():
+        baseline_seconds = baseline['seconds'].get(name)
+        if baseline_seconds and seconds > baseline_seconds * (1 + tolerance):
+            regressions.append(f'{name}: {baseline_seconds * 1000:.1f} ms -> {seconds * 1000:.1f} ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup of the mindoc command line tool')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats, the fastest is kept (default: 5)')
+    parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Allowed slowdown against the baseline (default: 0.3)')
+    args = parser.parse_args()
+
+    result = benchmark(args)
+    print_report(result)
+
+    if args.save:
+        baseline_file = open(args.save, 'w', encoding='utf-8')
+        json.dump(result, baseline_file, indent=2)
+        baseline_file.close()
+
+    failed = bool(result['leaks'])
+    if args.compare:
+        baseline_file = open(args.compare, 'r', encoding='utf-8')
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+        regressions = compare(result, baseline, args.tolerance)
+        print('')
+        if regressions:
+            print('Regressions against the baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            failed = True
+        else:
+            print('No regressions against the baseline.')
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
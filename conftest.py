@@ -0,0 +1 @@
+# Makes pytest put the root folder on sys.path, so the tests can import mindoc
@@ -29,7 +29,7 @@ If you want to apply the same style of documentation to a plain .md file and con
 I tried to minimise the package dependencies by using standard python libraries or included packages within the typical Anaconda distribution.
 
 * **mistune**: part of the standard Anaconda distribution
-* **beautifulsoup4**: part of the standard Anaconda distribution
+* **brotli** (optional): only for the .br copies of the pages with the compress flag (--compress)
 
 ### .py Code style
 
@@ -133,6 +133,8 @@ You will see in this documentation that there is a table of contents. mindoc gen
 
 mindoc will only use headings down to level 4 (####).
 
+With the cross-reference flag (--xref), the headers of all the converted files can be referenced from any of them, e.g. [orders_fact] in one .sql file links to the orders_fact heading of another.
+
 
 ### Diagrams
 
@@ -165,17 +167,42 @@ graph LR
 # The code
 
 ### Imports
+
+Only the modules that almost every run needs are imported here.
+The others, like mistune itself, are imported by the functions that need them, the first time they are called.
+This way mindoc --help, or a build where nothing changed, does not wait for packages it never uses.
 """
 import os
 import sys
-import glob
+import hashlib
 import re
+import functools
 import itertools
-import argparse
-import subprocess
+import collections
+import json
 import time
-import mistune
-from bs4 import BeautifulSoup
+import threading
+
+__version__ = '0.5.0'
+
+CACHE_DIR = '.mindoc-cache'
+
+SCRIPT_SOURCES = {
+    'prettify': 'https://cdn.jsdelivr.net/gh/google/code-prettify@master/loader/run_prettify.js',
+    'prettify-sql': 'https://cdnjs.cloudflare.com/ajax/libs/prettify/r298/lang-sql.min.js',
+    'mathjax': 'https://cdnjs.cloudflare.com/ajax/libs/mathjax/2.7.9/MathJax.js?config=TeX-AMS_HTML',
+    'mermaid': 'https://unpkg.com/mermaid@8.4.6/dist/mermaid.min.js',
+}
+
+VENDOR_DIR = 'mindoc-vendor'
+
+# In the copy of the vendor folder
+OFFLINE_SCRIPT_SOURCES = {
+    'prettify': 'prettify/run_prettify.js',
+    'prettify-sql': 'prettify/lang-sql.js',
+    'mathjax': 'mathjax/MathJax.js?config=TeX-AMS_HTML',
+    'mermaid': 'mermaid/mermaid.min.js',
+}
 """
 ## Conversion from code to documentation
 
@@ -204,36 +231,35 @@ def convert_python_blocks(code: str) -> str:
     A: They remain within the code blocks.
     So you can continue to use docstrings to document the functions if you want to.
     """
+    return ''.join(join_blocks(split_python_blocks(code), 'python'))
 
+
+def split_python_blocks(code: str):
     # Windows newline fix
     windows_newline = u'\r'+'\n'
     if windows_newline in code:
         code = code.replace(windows_newline, '\n')
     
-    # Make all code blocks (which are between markdown blocks) collapsible
-    # Remove first fenced triplet of double quotes (ftdq)
+    # Remove first fenced triplet of double quotes (ftdq), which is normally right at the start
     first_ftdq = '"""' + '\n'
-    pre_html = code.replace(first_ftdq, '', 1)
-
+    start = code.find(first_ftdq)
+    if start == 0:
+        start = len(first_ftdq)
+    elif start > 0:
+        code = code[:start] + code[start + len(first_ftdq):]
+        start = 0
+    else:
+        start = 0
+    
     # all subsequent ftdq must begin without any indentation and must end with a new line.
     ftdq = '\n' + '"""' + '\n'
-    br = tag('br')
-    div = tag('div')
-    ediv = endtag('div')
-    collapsible_button = tag('button type="button" class="collapsible" style="width: 80px; text-align:center; margin-bottom:0px;"')
-    ebutton = endtag('button')
-    content_div = tag('div style=" margin: 0;" class="content"')
-
-    md_python_start = '\n```' + 'python\n\n'
-    md_python_end = u'```\n\n'
-    replace_with_pre = '\n' + br + br + collapsible_button + 'View code' + ebutton + content_div + md_python_start
-    replace_with_post = '\n' + md_python_end + ediv + '\n'
-
-    pre_html = replace_every_nth(pre_html, ftdq, replace_with_pre, nth=2)
-    pre_html = pre_html.replace(ftdq, replace_with_post)
-    pre_html = pre_html + replace_with_post
-    
-    return pre_html
+    kinds = itertools.cycle(['doc', 'code'])
+    end = code.find(ftdq, start)
+    while end >= 0:
+        yield (next(kinds), code[start:end])
+        start = end + len(ftdq)
+        end = code.find(ftdq, start)
+    yield (next(kinds), code[start:])
 
 """
 #### 2.2 SQL
@@ -243,7 +269,10 @@ mindoc converts .sql files into .html documentation files.
 Unlike python, I don't anticipate SQL would benefit much with multiple markdown blocks. Therefore, only the first comment block is considered documentation using markdown.
 """
 def convert_sql_blocks(code: str) -> str:
-    
+    return ''.join(join_blocks(split_sql_blocks(code), 'sql'))
+
+
+def split_sql_blocks(code: str):
     # Windows newline fix
     windows_newline = u'\r'+'\n'
     if windows_newline in code:
@@ -253,39 +282,159 @@ def convert_sql_blocks(code: str) -> str:
     comment_end = '*' + '/'
     
     # Remove first comment block starter
-    pre_html = code.replace(comment_start, '', 1)
+    start = code.find(comment_start)
+    if start >= 0:
+        code = code[:start] + code[start + len(comment_start):]
+    
+    # The first comment block ender is where the code starts
+    end = code.find(comment_end)
+    if end < 0:
+        yield ('doc', code)
+    else:
+        yield ('doc', code[:end])
+        yield ('code', code[end + len(comment_end):])
+
+"""
+#### 2.3 Putting the blocks back together
+
+Both the .py and the .sql files are split into documentation and code blocks in a single pass, one block at a time.
 
-    # Replace first comment block ender with a code block starter
+Here, the code blocks are turned into collapsibles and everything is put back together as markdown.
+"""
+def join_blocks(blocks, language: str):
     br = tag('br')
-    div = tag('div')
     ediv = endtag('div')
     collapsible_button = tag('button type="button" class="collapsible" style="width: 80px; text-align:center; margin-bottom:0px;"')
     ebutton = endtag('button')
     content_div = tag('div style=" margin: 0;" class="content"')
+    
+    if language == 'python':
+        code_start = '\n' + br + br + collapsible_button + 'View code' + ebutton + content_div + '\n```' + 'python\n\n'
+        code_end = '\n' + u'```\n\n' + ediv + '\n'
+    else:
+        code_start = br + collapsible_button + 'View code' + ebutton + content_div + '\n```' + language
+        code_end = u'```\n' + ediv + '\n'
+    
+    # Every documentation block is followed by a code block, and the last block is always closed
+    previous_block = None
+    for block in blocks:
+        if previous_block is not None:
+            yield previous_block[1]
+            yield code_start if previous_block[0] == 'doc' else code_end
+        previous_block = block
+    yield previous_block[1]
+    yield code_end
+"""
 
-    md_sql_start = '\n```' + 'sql'
-    md_sql_end = u'```\n'
-    replace_with_pre = br + collapsible_button + 'View code' + ebutton + content_div + md_sql_start
-    replace_with_post = md_sql_end + ediv + '\n'
 
-    pre_html = pre_html.replace(comment_end, replace_with_pre, 1)
-    pre_html = pre_html + replace_with_post
+### 3 Convert the code to a html doc
 
-    return pre_html
+This function converts the documentation blocks into html code, converting the markdown syntax into html.
 
+The function also styles the document.
 """
+def convert_to_html(pre_html: str, options: dict = None, seconds: dict = None, symbols: dict = None, html_file_path: str = None) -> str:
+    if options is None:
+        options = {}
+    if seconds is None:
+        seconds = {}
+    
+    # Convert the body markdown to html, collecting the headers for the table of contents on the way
+    start_time = time.perf_counter()
+    toc_tag = '[TOC]'
+    markdown = get_markdown()
+    markdown.renderer.reset(link_to_toc=toc_tag in pre_html, prerender=options.get('prerender', False), header_ids=symbols is not None)
+    if options.get('block_cache', False) and html_file_path is not None:
+        body = render_units(markdown, pre_html, hashlib.sha1(html_file_path.encode('utf-8')).hexdigest() + '.json')
+    elif html_file_path in converted_docs:
+        body = render_units(markdown, pre_html)
+    else:
+        body = markdown(pre_html)
+        if html_file_path is not None:
+            converted_docs.add(html_file_path)
+    seconds['markdown'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
 
+    # Clean up some weird stuff that the markdown to html conversion introduced
+    body = clean_up(body)
+    
+    # Put the html together
+    (page_start, page_end) = get_page_shell(
+        external_assets=options.get('external_assets', False),
+        offline=get_vendor_href(options, html_file_path) if 'offline' in options else None,
+        uses_prettify='class="prettyprint lang-' in body,
+        uses_math=has_math(body),
+        uses_mermaid='class="mermaid"' in body)
+    seconds['cleanup'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if symbols is not None:
+        body = link_symbols(body, symbols, html_file_path)
+    html = page_start + body + page_end
+    if toc_tag in html:
+        if symbols is not None:
+            # link_symbols has already linked the headers of this file, outside the code blocks
+            html = html.replace(toc_tag, get_toc_html(markdown.renderer.header_list), 1)
+        else:
+            html = create_toc(html, markdown.renderer.header_list)
+    seconds['toc'] = time.perf_counter() - start_time
+    
+    return html
 
-### 3 Convert the code to a html doc
 
-This function converts the documentation blocks into html code, converting the markdown syntax into html.
+# Each pattern starts with a fixed character, which is found far faster than any one of a few characters,
+# so a few quick passes over the page beat a single slow one
+CLEANUP_PATTERNS = [
+    re.compile(r'(<(?:(?:br>|/p>)[\w\W]<pre>|/?p>))'),
+    re.compile(r'(code class="(?:lang-mermaid)?)'),
+    re.compile(r'(prettyprint lang-mermaid)'),
+    re.compile(r'(&(?:lt|gt|amp);)'),
+]
 
-The function also styles the document.
+CLEANUP_REPLACEMENTS = {
+    # No paragraphs, only line breaks, and none right before a code block (which is replaced by the pre tag)
+    '<p>': '',
+    '</p>': '<br>',
+    # This bit allows the Google Code Prettify to work
+    'code class="': 'code class="prettyprint ',
+    # This bit allows the MermaidJS to work
+    'code class="lang-mermaid': 'code class="mermaid',
+    'prettyprint lang-mermaid': 'mermaid',
+    # The html in the markdown was escaped by the converter
+    '&lt;': '<',
+    '&gt;': '>',
+    '&amp;': '&',
+}
+
+
+def clean_up(body: str) -> str:
+    # The converter only writes <p> at the start of a paragraph and escapes any other html, so the fixes do not depend on each other.
+    # A pass only copies the page when it finds something to fix.
+    for pattern in CLEANUP_PATTERNS:
+        pieces = pattern.split(body)
+        if len(pieces) > 1:
+            # Every other piece is a match
+            pieces[1::2] = [CLEANUP_REPLACEMENTS.get(piece, tag('pre')) for piece in pieces[1::2]]
+            body = ''.join(pieces)
+    return body
 """
-def convert_to_html(pre_html: str) -> str:
-    meta = tag('meta name="viewport" content="width=device-width, initial-scale=1"')
-        
-    style = tag('style') + u'''
+#### 3.1 The markdown converter and the page
+
+The markdown converter and the page around the converted body are the same for every document.
+They are only put together once, the first time they are needed, and then reused for every file.
+"""
+@functools.lru_cache(maxsize=None)
+def get_markdown():
+    import mistune
+    renderer = mix_in(DocRenderer, mistune.Renderer)(escape=True, hard_wrap=True, use_xhtml=False)
+    return mistune.Markdown(renderer=renderer)
+
+
+@functools.lru_cache(maxsize=None)
+def get_page_assets() -> tuple:
+    # The style of the page
+    css = u'''
         body {
             width: 90%; max-width: 1200px; margin: auto; font-family: Helvetica, arial, sans-serif; font-size: 14px; line-height: 1.6;
             background-color: white; padding: 10px; color: #333;
@@ -408,10 +557,10 @@ def convert_to_html(pre_html: str) -> str:
         pre .atn, code .atn { color: #404 }
         pre .atv, code .atv { color: #060 }
         }
-        ''' + endtag('style')
+        '''
     
     # Make code collapsible
-    script = tag('script') + u'''
+    js = u'''
         var coll = document.getElementsByClassName("collapsible");
         var i;
         for (i = 0; i < coll.length; i++) {
@@ -425,15 +574,38 @@ def convert_to_html(pre_html: str) -> str:
             } 
           });
         }
-        ''' + endtag('script')
+        '''
+    
+    return (css, js)
+
+
+@functools.lru_cache(maxsize=None)
+def get_page_shell(external_assets: bool = False, offline: str = None,
+                   uses_prettify: bool = True, uses_math: bool = True, uses_mermaid: bool = True) -> tuple:
+    meta = tag('meta name="viewport" content="width=device-width, initial-scale=1"')
+    
+    (css, js) = get_page_assets()
+    if external_assets:
+        (css_file_name, js_file_name) = get_asset_file_names()
+        style = tag(f'link rel="stylesheet" href="{css_file_name}"')
+        script = tag(f'script src="{js_file_name}"') + endtag('script')
+    else:
+        style = tag('style') + css + endtag('style')
+        script = tag('script') + js + endtag('script')
+    
+    script_sources = SCRIPT_SOURCES
+    if offline is not None:
+        script_sources = {name: f'{offline}/{source}' for (name, source) in OFFLINE_SCRIPT_SOURCES.items()}
     
     # JavaScript styling of the code blocks
-    script += tag('script src="https://cdn.rawgit.com/google/code-prettify/master/loader/run_prettify.js"') + endtag('script')
-    script += tag('script src="https://cdnjs.cloudflare.com/ajax/libs/prettify/r298/lang-sql.min.js"') + endtag('script')
+    if uses_prettify:
+        script += tag(f'script src="{script_sources["prettify"]}"') + endtag('script')
+        script += tag(f'script src="{script_sources["prettify-sql"]}"') + endtag('script')
 
     # JavaScript to allow MathJax
-    script += tag('script src="https://cdn.mathjax.org/mathjax/latest/MathJax.js?config=TeX-AMS_HTML"') + endtag('script')
-    script += tag('script type="text/x-mathjax-config"') + u'''
+    if uses_math:
+        script += tag(f'script src="{script_sources["mathjax"]}"') + endtag('script')
+        script += tag('script type="text/x-mathjax-config"') + u'''
         MathJax.Hub.Config({
             tex2jax: {
                 inlineMath: [ ["$","$"], ["\\\\(","\\\\)"] ],
@@ -452,37 +624,561 @@ def convert_to_html(pre_html: str) -> str:
         ''' + endtag('script')
     
     # JavaScript to allow MermaidJS (8.4.5 modified to neutral theme) for diagrams
-    script += tag('script src="https://unpkg.com/mermaid@8.4.6/dist/mermaid.min.js"') + endtag('script')
-    script += tag('script') + "var config = { startOnLoad:true }; mermaid.initialize(config);" + endtag('script')
+    if uses_mermaid:
+        script += tag(f'script src="{script_sources["mermaid"]}"') + endtag('script')
+        script += tag('script') + "var config = { startOnLoad:true }; mermaid.initialize(config);" + endtag('script')
+    
+    page_start = tag('!DOCTYPE html') + tag('html') + tag('head') + meta + style + endtag('head') + tag('body')
+    page_end = script + endtag('body') + endtag('html')
+    return (page_start, page_end)
 
-    # Convert the body markdown to html
-    renderer = mistune.Renderer(escape=True, hard_wrap=True, use_xhtml=False)
-    markdown = mistune.Markdown(renderer=renderer)
-    body = markdown(pre_html)
 
-    # Clean up some weird stuff that the markdown to html conversion introduced
-    br = tag('br')
-    body = body.replace(tag('p'), '')
-    body = body.replace(endtag('p'), br)
-    pre = tag('pre')
-    body = re.sub(br+r'[\w\W+]'+pre, pre, body)
+# MathJax leaves code alone, so only the delimiters it looks for in the text outside of code count
+MATH_PATTERN = re.compile(r'<(pre|code)\b[\s\S]*?</\1>|(?P<math>\$\$|\\\(|\\\[|\$(?:[^$<]|<(?!/?(?:pre|code)\b))+\$)')
 
-    # This bit allows the Google Code Prettify to work
-    body = body.replace('code ' + 'class="', 'code class="prettyprint ')
 
-    # This bit allows the MermaidJS to work
-    body = body.replace('prettyprint ' + 'lang-mermaid', 'mermaid')
+def has_math(body: str) -> bool:
+    return any(match.group('math') for match in MATH_PATTERN.finditer(body))
+"""
+#### 3.2 Shared style and script files
+
+By default, every page carries its own copy of the style and the script that makes the code collapsible.
+
+With the external assets flag (--external-assets), they are written once into each docs folder as mindoc.css and mindoc.js instead, and every page links to them.
+Browsers can then cache them across pages.
+The content hash is part of the file names (e.g. mindoc.3f2a9c1e.css), so a new version of mindoc never gets served a stale cached copy.
+"""
+@functools.lru_cache(maxsize=None)
+def get_asset_file_names() -> tuple:
+    (css, js) = get_page_assets()
+    css_file_name = 'mindoc.' + hashlib.sha1(css.encode('utf-8')).hexdigest()[:8] + '.css'
+    js_file_name = 'mindoc.' + hashlib.sha1(js.encode('utf-8')).hexdigest()[:8] + '.js'
+    return (css_file_name, js_file_name)
+
+
+saved_asset_dirs = set()
+
+
+def save_assets(docs_dir: str):
+    if docs_dir in saved_asset_dirs:
+        return
+    for (content, file_name) in zip(get_page_assets(), get_asset_file_names()):
+        save_as(content, os.path.join(docs_dir, file_name))
+    saved_asset_dirs.add(docs_dir)
+"""
+#### 3.3 Offline documentation
+
+The pages load Google Code Prettify, MathJax and MermaidJS from the internet, but only when they need them:
+MathJax only on pages with math in them, and MermaidJS only on pages with diagrams.
+
+Without internet access, e.g. on an air-gapped network, use the offline option (--offline) with a folder that has local copies of these scripts laid out like this:
+
+* prettify/run_prettify.js and prettify/lang-sql.js
+* mathjax/MathJax.js (with the rest of the MathJax 2 distribution next to it)
+* mermaid/mermaid.min.js
+
+> mindoc --offline ./vendor ./src/*.py
+
+The folder is copied only once, as mindoc-vendor in the folder that has all the docs in it, e.g. docs when every page is saved in docs.
+Every page loads the scripts from there with a path relative to the page, e.g. ../mindoc-vendor/mermaid/mermaid.min.js.
+Files that are already up to date in the copy are not copied again.
+"""
+saved_vendor_dirs = set()
+
+
+def get_vendor_copy_dir(code_files: list) -> str:
+    # The deepest folder that has the docs of all the code files in it
+    docs_dirs = [os.path.dirname(os.path.abspath(get_html_file_path(code_file_path))) for code_file_path in code_files]
+    if not docs_dirs:
+        return VENDOR_DIR
+    return os.path.relpath(os.path.join(os.path.commonpath(docs_dirs), VENDOR_DIR))
+
+
+def get_vendor_copy(options: dict, html_file_path: str) -> str:
+    # The copy shared by all the docs, or one next to the page when the docs were not made together, e.g. by make_doc
+    return options.get('vendor_copy', os.path.join(os.path.dirname(html_file_path), VENDOR_DIR))
+
+
+def get_vendor_href(options: dict, html_file_path: str = None) -> str:
+    if html_file_path is None:
+        return VENDOR_DIR
+    return os.path.relpath(get_vendor_copy(options, html_file_path), os.path.dirname(html_file_path) or '.').replace(os.sep, '/')
+
+
+def save_vendor_files(copy_dir: str, vendor_dir: str):
+    import shutil
+    if copy_dir in saved_vendor_dirs:
+        return
+    for (dir_path, dir_names, file_names) in os.walk(vendor_dir):
+        target_dir = os.path.normpath(os.path.join(copy_dir, os.path.relpath(dir_path, vendor_dir)))
+        os.makedirs(target_dir, exist_ok=True)
+        for file_name in file_names:
+            source_path = os.path.join(dir_path, file_name)
+            target_path = os.path.join(target_dir, file_name)
+            source_stat = os.stat(source_path)
+            if os.path.exists(target_path):
+                target_stat = os.stat(target_path)
+                if (target_stat.st_mtime_ns, target_stat.st_size) == (source_stat.st_mtime_ns, source_stat.st_size):
+                    continue
+            shutil.copy2(source_path, target_path)
+    saved_vendor_dirs.add(copy_dir)
+"""
+#### 3.4 Highlighting and diagrams at build time
+
+Google Code Prettify and MermaidJS do their work in the browser every time a page is opened, which can make pages with a lot of code slow to become usable.
+
+With the prerender flag (--prerender), mindoc does that work while building the documentation instead:
+
+* Python and SQL code blocks are highlighted with the same classes Google Code Prettify uses (.str, .kwd, .com, ...), so they look the same.
+* Diagrams are drawn with the mermaid command line tool (mmdc) if it is installed, and embedded as images.
+Each diagram is only drawn once: the image is cached in the cache folder under the hash of the diagram.
+
+Code blocks in other languages, and diagrams that can not be drawn, are still left to the browser.
+"""
+PYTHON_KEYWORDS = {
+    'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue', 'def', 'del', 'elif', 'else', 'except',
+    'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass',
+    'raise', 'return', 'try', 'while', 'with', 'yield', 'None', 'True', 'False',
+}
+
+SQL_KEYWORDS = {
+    'ADD', 'ALL', 'ALTER', 'AND', 'ANY', 'AS', 'ASC', 'BETWEEN', 'BY', 'CASE', 'CAST', 'CHECK', 'COLUMN',
+    'CONSTRAINT', 'CREATE', 'CROSS', 'DATABASE', 'DEFAULT', 'DELETE', 'DESC', 'DISTINCT', 'DROP', 'ELSE', 'END',
+    'EXCEPT', 'EXISTS', 'FOREIGN', 'FROM', 'FULL', 'GROUP', 'HAVING', 'IN', 'INDEX', 'INNER', 'INSERT',
+    'INTERSECT', 'INTO', 'IS', 'JOIN', 'KEY', 'LEFT', 'LIKE', 'LIMIT', 'NOT', 'NULL', 'ON', 'OR', 'ORDER',
+    'OUTER', 'OVER', 'PARTITION', 'PRIMARY', 'REFERENCES', 'RIGHT', 'SELECT', 'SET', 'TABLE', 'THEN', 'TOP',
+    'TRUNCATE', 'UNION', 'UNIQUE', 'UPDATE', 'VALUES', 'VIEW', 'WHEN', 'WHERE', 'WITH',
+}
+
+HIGHLIGHT_PATTERNS = {
+    'python': re.compile(
+        r'(?P<com>#[^\n]*)'
+        r'|(?P<str>[rRbBuUfF]{0,2}(?:"{3}[\s\S]*?"{3}|\'{3}[\s\S]*?\'{3}|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'))'
+        r'|(?P<lit>0[xXoObB][\da-fA-F_]+|\d[\d_]*(?:\.[\d_]*)?(?:[eE][+-]?\d+)?[jJ]?)'
+        r'|(?P<name>[^\W\d]\w*)'
+        r'|(?P<pun>[^\w\s"\'#]+|[^\w\s])'),
+    'sql': re.compile(
+        r'(?P<com>--[^\n]*|/\*[\s\S]*?\*/)'
+        r'|(?P<str>\'(?:\'\'|[^\'])*\')'
+        r'|(?P<lit>\d+(?:\.\d+)?)'
+        r'|(?P<name>[^\W\d]\w*)'
+        r'|(?P<pun>[^\w\s\'/-]+|[^\w\s])'),
+}
+
+
+def highlight_code(code: str, lang: str) -> str:
+    import mistune
+    html = ''
+    position = 0
+    for match in HIGHLIGHT_PATTERNS[lang].finditer(code):
+        html += mistune.escape(code[position:match.start()], smart_amp=False)
+        position = match.end()
+        
+        text = match.group()
+        kind = match.lastgroup
+        if kind == 'name':
+            if (lang == 'python' and text in PYTHON_KEYWORDS) or (lang == 'sql' and text.upper() in SQL_KEYWORDS):
+                kind = 'kwd'
+            elif text[0].isupper() and lang == 'python':
+                kind = 'typ'
+            else:
+                kind = 'pln'
+        html += tag(f'span class="{kind}"') + mistune.escape(text, smart_amp=False) + endtag('span')
+    html += mistune.escape(code[position:], smart_amp=False)
     
-    # Put the html together
-    html = tag('!DOCTYPE html') + tag('html') + tag('head') + meta + style + endtag('head') + tag('body') + body + script + endtag('body') + endtag('html')
-    html = unescape(html)
+    # The prettyprinted class tells Google Code Prettify that this block has already been done
+    return tag('pre') + tag(f'code class="prettyprinted lang-{lang}"') + html + '\n' + endtag('code') + endtag('pre') + '\n'
+
+
+rendered_diagrams = {}
+
+
+def render_diagram(diagram: str):
+    import base64
+    digest = hashlib.sha1(diagram.encode('utf-8')).hexdigest()
+    if digest not in rendered_diagrams:
+        svg_file_path = os.path.join(CACHE_DIR, 'diagrams', digest + '.svg')
+        if not os.path.exists(svg_file_path) and not draw_diagram(diagram, svg_file_path):
+            return None
+        
+        # The image is embedded as base64, so that nothing in it gets unescaped with the rest of the page
+        svg_file = open(svg_file_path, 'rb')
+        svg = base64.b64encode(svg_file.read()).decode('ascii')
+        svg_file.close()
+        rendered_diagrams[digest] = tag('p') + tag(f'img class="diagram" alt="diagram" src="data:image/svg+xml;base64,{svg}"') + endtag('p') + '\n'
+    return rendered_diagrams[digest]
+
+
+def draw_diagram(diagram: str, svg_file_path: str) -> bool:
+    import shutil
+    import subprocess
+    mermaid_cli = shutil.which('mmdc')
+    if mermaid_cli is None:
+        return False
     
-    return html
+    diagram_file_path = svg_file_path[:-len('.svg')] + '.mmd'
+    save_as(diagram, diagram_file_path)
+    result = subprocess.run([mermaid_cli, '-i', diagram_file_path, '-o', svg_file_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.remove(diagram_file_path)
+    return result.returncode == 0 and os.path.exists(svg_file_path)
+"""
+#### 3.5 Converting the blocks one at a time
+
+Editing one paragraph of a big file should not mean converting the whole file to html again.
+The markdown is cut into units right after the end of every code block, so a unit is a code block and the documentation before it.
+Every unit is converted on its own and kept in a cache under the hash of its text, and only the units that changed are converted again.
+The cache keeps the last RENDER_CACHE_SIZE units in memory, which is what watch mode and mindoc serve use.
+With the block cache flag (--block-cache) the units of each file are also saved in the cache folder, for the next build.
+
+Converting a file unit by unit is a bit slower than converting it at once, when nothing is in the cache yet.
+Without the block cache flag, a file is only converted unit by unit from the second time it is converted, e.g. after the first change in watch mode.
+
+Converting the units one by one only gives the same html as converting the whole file if every unit ends with its own code block.
+That is not always the case: a list at the end of a documentation block, for example, takes in the lines after it, including the start of the code block.
+Such a unit is put together with the next one, until the code block at the end is converted as a code block again.
+When links or footnotes are defined, which the other units could use, the whole file is converted at once.
+"""
+RENDER_CACHE_SIZE = 10000
+BLOCK_CACHE_DIR = os.path.join(CACHE_DIR, 'blocks')
+
+rendered_units = collections.OrderedDict()
+
+converted_docs = set()
+
+
+def render_units(markdown, pre_html: str, block_cache_file_name: str = None) -> str:
+    renderer = markdown.renderer
+    flags = (renderer.link_to_toc, renderer.prerender, renderer.header_ids)
+    
+    # Cut the markdown right after the end of every code block
+    units = []
+    unit_start = 0
+    for match in re.finditer(r'```\n\n?(?=</div>\n)', pre_html):
+        units.append(pre_html[unit_start:match.end()])
+        unit_start = match.end()
+    units.append(pre_html[unit_start:])
+    
+    saved_units = {}
+    if block_cache_file_name is not None:
+        saved_units = load_cache_file(BLOCK_CACHE_DIR, block_cache_file_name).get('units', {})
+    
+    body = renderer.placeholder()
+    file_units = {}
+    unit = ''
+    number = 0
+    step = 1
+    while number < len(units):
+        # After a unit that does not end with its code block, the next try takes twice as many units as the one before
+        unit += ''.join(units[number:number + step])
+        number += step
+        last = number >= len(units)
+        
+        # The first header does not link back to the table of contents, so it matters whether a header came before
+        key = hashlib.sha1(repr((unit, flags, bool(renderer.header_list))).encode('utf-8')).hexdigest()
+        rendered = rendered_units.get(key)
+        if rendered is None and key in saved_units:
+            (html, headers, ends_with_code) = saved_units[key]
+            rendered = (html, [tuple(header) for header in headers], ends_with_code)
+        if rendered is None or (last and rendered[0] is None):
+            rendered = render_unit(markdown, unit, last)
+            if rendered is None:
+                renderer.reset(*flags)
+                return markdown(pre_html)
+        else:
+            renderer.header_list.extend(rendered[1])
+        
+        rendered_units[key] = rendered
+        rendered_units.move_to_end(key)
+        if len(rendered_units) > RENDER_CACHE_SIZE:
+            rendered_units.popitem(last=False)
+        file_units[key] = rendered
+        
+        if rendered[0] is None:
+            step *= 2
+        else:
+            body += rendered[0]
+            unit = ''
+            step = 1
+    
+    if block_cache_file_name is not None and file_units.keys() != saved_units.keys():
+        save_as(json.dumps({'version': __version__, 'units': file_units}), os.path.join(BLOCK_CACHE_DIR, block_cache_file_name))
+    return body
+
+
+def render_unit(markdown, unit: str, last: bool = False):
+    import mistune
+    header_count = len(markdown.renderer.header_list)
+    unit = mistune.preprocessing(unit)
+    
+    # A fence or a raw html block that is not closed in the unit could still be closed in one of the next units
+    rules = markdown.block.rules
+    rules.fences = OpenBlockCheck(mistune.BlockGrammar.fences, r' *(?:`{3,}|~{3,})')
+    rules.block_html = OpenBlockCheck(mistune.BlockGrammar.block_html, r' *<(?:!--|' + mistune._block_tag + ')')
+    tokens = markdown.block(unit)
+    open_ended = rules.fences.open_ended or rules.block_html.open_ended
+    del rules.fences, rules.block_html
+    markdown.block.tokens = []
+    if markdown.block.def_links or markdown.block.def_footnotes:
+        markdown.block.def_links = {}
+        markdown.block.def_footnotes = {}
+        return None
+    
+    # The last token has to be the whole code block, from the line after the opening fence to the closing fence
+    code_start = unit.rfind('class="content">\n')
+    code = unit[unit.find('\n', code_start + len('class="content">\n')) + 1:].rstrip()[:-len('```')].rstrip()
+    ends_with_code = code_start >= 0 and bool(tokens) and tokens[-1]['type'] == 'code' and tokens[-1]['text'] == code and not open_ended
+    
+    # Paragraphs end where a fence starts, so a line in a paragraph that starts like a fence is a fence that was not closed
+    for token in tokens:
+        if token['type'] == 'paragraph' and re.search(r'^ *(?:`{3,}|~{3,})', token['text'], re.M):
+            ends_with_code = False
+    
+    # A unit that does not end with its code block is converted together with the next one
+    if not ends_with_code and not last:
+        return (None, [], False)
+    
+    markdown.tokens = tokens[::-1]
+    markdown.inline.setup({}, {})
+    html = markdown.renderer.placeholder()
+    while markdown.pop():
+        html += markdown.tok()
+    return (html, markdown.renderer.header_list[header_count:], ends_with_code)
+
+
+class OpenBlockCheck:
+    
+    # Stands in for a rule of the markdown block lexer, and notes when a block starts but is not closed
+    
+    def __init__(self, pattern, start_pattern: str):
+        self.pattern = pattern
+        self.start_pattern = re.compile(start_pattern)
+        self.open_ended = False
+    
+    def match(self, text: str):
+        block = self.pattern.match(text)
+        if self.start_pattern.match(text):
+            # An opening tag on its own could also be the start of a longer block, up to a closing tag further on
+            single_tag = block is not None and block.lastindex is None and not block.group(0).lstrip().startswith('<!--')
+            if block is None or single_tag:
+                self.open_ended = True
+        return block
+"""
+#### 3.6 Very large pages
+
+A page with a lot of code in it, e.g. a big SQL catalog, takes a while to download and to show, even though the code is hidden until it is opened.
+
+With the lazy code flag (--lazy-code), the code blocks are left out of the page.
+They are saved next to it in a script file, e.g. awesome.code.js, which the page only loads the first time a code block is opened.
+It is a script rather than a data file, so that it also works for pages opened straight from the disk.
+
+With the split size option (--split-size), pages bigger than that many kilobytes are split into several pages at their h1 and h2 headers, e.g. awesome.html, awesome-2.html and awesome-3.html.
+Every page gets the table of contents, links to the headers on the other pages lead there, and the pages link to each other at the bottom.
+Links from other files (with the cross-reference flag) still lead to the first page, which sends the browser on to the page the header is on.
+
+Every file a doc was saved as is kept in the manifest of the cache folder (see [Build cache]), so that the pages and code scripts a doc is no longer split into are removed when it is built again, e.g. with a bigger split size or without these options.
+
+Both only change the pages that are saved; mindoc serve and render still give the whole page.
+"""
+LAZY_CODE_SCRIPT = (
+    'document.addEventListener("click", function (event) {'
+    ' var button = event.target; var content = button.nextElementSibling;'
+    ' if (!button.classList.contains("collapsible") || !content || !content.hasAttribute("data-code")) { return; }'
+    ' if (window.mindocCode) {'
+    ' content.innerHTML = mindocCode[content.getAttribute("data-code")]; content.removeAttribute("data-code");'
+    ' if (window.PR) { PR.prettyPrint(); } return; }'
+    # Opened again once the code is loaded, and only then does the click reach the script that makes the code collapsible
+    ' event.stopPropagation();'
+    ' if (!window.mindocCodeScript) {'
+    ' mindocCodeScript = document.createElement("script"); mindocCodeScript.src = mindocCodeFile;'
+    ' mindocCodeScript.addEventListener("load", function () { button.click(); });'
+    ' document.head.appendChild(mindocCodeScript); } }, true);'
+)
+
+MOVED_HEADERS_SCRIPT = (
+    'var mindocMovedIds = MOVED_IDS, mindocId = decodeURIComponent(location.hash.slice(1));'
+    ' if (mindocMovedIds.hasOwnProperty(mindocId)) { location.replace(mindocMovedIds[mindocId] + location.hash); }'
+)
+
+
+def get_pages(html: str, html_file_path: str, options: dict, header_list: list) -> list:
+    if options.get('minify', False):
+        html = minify_html(html)
+    pages = [(html_file_path, html)]
+    if options.get('split_size') and len(html) > options['split_size']:
+        pages = split_page(html, html_file_path, header_list, options['split_size'])
+    if options.get('lazy_code', False):
+        pages = [lazy_page for (page_file_path, page) in pages for lazy_page in move_out_code(page, page_file_path)]
+    return pages
+
+
+def split_page(html: str, html_file_path: str, header_list: list, split_size: int) -> list:
+    # The scripts after the body always start with the one that makes the code collapsible
+    (css, js) = get_page_assets()
+    (css_file_name, js_file_name) = get_asset_file_names()
+    body_start = html.find(tag('body')) + len(tag('body'))
+    body_end = max(html.rfind(tag('script') + js), html.rfind(tag(f'script src="{js_file_name}"')))
+    body = html[body_start:body_end]
+
+    # Cut before every h1 and h2 header, but not in the code, then put the pieces together up to the split size
+    sections = []
+    start = 0
+    for match in re.finditer(r'<pre>[\s\S]*?</pre>|^<h[12][ >]', body, re.M):
+        if match.group().startswith('<h') and match.start() > start:
+            sections.append(body[start:match.start()])
+            start = match.start()
+    sections.append(body[start:])
+    parts = [sections[0]]
+    for section in sections[1:]:
+        if len(parts[-1]) + len(section) > split_size:
+            parts.append(section)
+        else:
+            parts[-1] += section
+    if len(parts) == 1:
+        return [(html_file_path, html)]
+
+    (base_path, extension) = os.path.splitext(html_file_path)
+    page_file_paths = [html_file_path] + [f'{base_path}-{number}{extension}' for number in range(2, len(parts) + 1)]
+
+    toc_html = get_toc_html(header_list)
+    if any(toc_html in part for part in parts):
+        parts = [part if toc_html in part else toc_html + part for part in parts]
+
+    # Each header id is linked to the page it ended up on
+    page_ids = [set(re.findall(r'\bid="([^"]*)"', part)) for part in parts]
+    id_pages = {}
+    for (page_file_path, ids) in zip(page_file_paths, page_ids):
+        for header_id in ids:
+            id_pages.setdefault(header_id, os.path.basename(page_file_path))
+
+    pages = []
+    for (page_file_path, part, ids) in zip(page_file_paths, parts, page_ids):
+        part = link_pages(part, ids, id_pages) + get_page_links(page_file_paths, page_file_path)
+        pages.append((page_file_path, html[:body_start] + part + html[body_end:]))
+    
+    # Links from other files and from the index lead to the first page, which sends them on to the page with the header
+    moved_ids = {header_id: page for (header_id, page) in id_pages.items() if header_id not in page_ids[0]}
+    if moved_ids:
+        script = tag('script') + MOVED_HEADERS_SCRIPT.replace('MOVED_IDS', json.dumps(moved_ids, sort_keys=True).replace('</', '<\\/')) + endtag('script')
+        pages[0] = (html_file_path, pages[0][1][:body_start] + script + pages[0][1][body_start:])
+    return pages
+
+
+def link_pages(html: str, ids: set, id_pages: dict) -> str:
+
+    def link(match):
+        header_id = match.group(1)
+        if header_id in ids or header_id not in id_pages:
+            return match.group()
+        return f'href="{id_pages[header_id]}#{header_id}"'
+
+    return re.sub(r'href="#([^"]*)"', link, html)
+
+
+def get_page_links(page_file_paths: list, current_file_path: str) -> str:
+    links = []
+    for (number, page_file_path) in enumerate(page_file_paths, 1):
+        if page_file_path == current_file_path:
+            links.append(tag('b') + str(number) + endtag('b'))
+        else:
+            links.append(tag(f'a style="color: #555;" href="{os.path.basename(page_file_path)}"') + str(number) + endtag('a'))
+    return tag('p style="color: #555"') + 'Pages: ' + ' '.join(links) + endtag('p') + '\n'
+
+
+def move_out_code(html: str, html_file_path: str) -> list:
+    code_blocks = []
+
+    def move_out(match):
+        code_blocks.append(match.group(2))
+        return match.group(1)[:-1] + f' data-code="{len(code_blocks) - 1}">'
+
+    # Only the code blocks that make up a whole collapsible, as put together by join_blocks
+    content_div = tag('div style=" margin: 0;" class="content"')
+    html = re.sub('(' + re.escape(content_div) + r')(<pre>[\s\S]*?</pre>\n)(?=' + endtag('div') + ')', move_out, html)
+    if not code_blocks:
+        return [(html_file_path, html)]
+
+    code_file_path = os.path.splitext(html_file_path)[0] + '.code.js'
+    script = tag('script') + f'var mindocCodeFile = {json.dumps(os.path.basename(code_file_path))}; ' + LAZY_CODE_SCRIPT + endtag('script')
+    body_end = html.rfind(endtag('body'))
+    html = html[:body_end] + script + html[body_end:]
+    return [(html_file_path, html), (code_file_path, 'var mindocCode = ' + json.dumps(code_blocks) + ';\n')]
+"""
+#### 3.7 Smaller pages for static serving
+
+With the minify flag (--minify), every run of spaces and new lines in a page is collapsed into a single space, or a single new line when there was one in it.
+What is in pre, script and textarea tags is left as it is, so the code blocks, diagrams and scripts do not change.
+The page looks the same in the browser.
+
+With the compress flag (--compress), every saved page also gets a gzip compressed copy next to it, e.g. awesome.html.gz, and a brotli compressed one, e.g. awesome.html.br, if the brotli package is installed.
+Web servers like nginx (gzip_static, brotli_static) can send these as they are, instead of compressing the page for every request.
+A page is only compressed again when its .gz copy was made from another page, e.g. one saved by a run without the compress flag.
+The end of a gzip file holds the CRC-32 and the size of what was compressed, and these are compared with the page.
+"""
+COMPRESSED_EXTENSIONS = ('.gz', '.br')
+
+
+def minify_html(html: str) -> str:
+
+    def collapse(match):
+        if match.group(1) is not None:
+            return match.group()
+        return '\n' if '\n' in match.group() else ' '
+
+    return re.sub(r'(<(pre|script|textarea)\b[\s\S]*?</\2>)|\s{2,}', collapse, html, flags=re.I)
+
+
+def save_compressed(content: str, file_path: str):
+    import io
+    import gzip
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    data = content.encode('utf-8')
+    extensions = [extension for extension in COMPRESSED_EXTENSIONS if extension != '.br' or brotli is not None]
+    if is_compressed_copy(data, file_path + '.gz') and all(os.path.exists(file_path + extension) for extension in extensions):
+        return
+    if brotli is None and os.path.exists(file_path + '.br'):
+        # Made from another page, and it can not be made again
+        os.remove(file_path + '.br')
+    for extension in extensions:
+        if extension == '.gz':
+            # No time stamp in the gzip header, so that the same page always gives the same file
+            buffer = io.BytesIO()
+            gzip_file = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0)
+            gzip_file.write(data)
+            gzip_file.close()
+            compressed = buffer.getvalue()
+        else:
+            compressed = brotli.compress(data)
+        save_as(compressed, file_path + extension)
+
+
+def is_compressed_copy(data: bytes, gzip_file_path: str) -> bool:
+    # A gzip file ends with the CRC-32 and the size of what was compressed
+    import struct
+    import zlib
+    try:
+        gzip_file = open(gzip_file_path, 'rb')
+    except OSError:
+        return False
+    try:
+        gzip_file.seek(-8, os.SEEK_END)
+        trailer = gzip_file.read()
+    except OSError:
+        trailer = b''
+    gzip_file.close()
+    return trailer == struct.pack('<II', zlib.crc32(data), len(data) & 0xffffffff)
 """
 ### 4 Create Table of Contents
 
 The user can place a single line of [TOC] within the first block of docstrings.
 
+The headers are collected while the markdown is converted to html, so the document is only parsed once.
+When there is a TOC tag, the renderer also gives each header down to level 4 an id and a link back to the table of contents.
+
 This function will replace the TOC tag with an automatically generated table of contents down to heading level 4.
 
 This function will also create links for all cross-references to a header.
@@ -500,56 +1196,154 @@ will become this --> [.py Code style] (yes, this is a link).<br>
 **Warning**: Using some non-alphanumeric characters *within* the header markdown will cause errors.
 
 """
-def create_toc(html: str) -> str:
+class DocRenderer:
     
-    soup = BeautifulSoup(html, "html.parser")
+    # Mixed into mistune.Renderer by get_markdown, so that mistune is only imported when a file is converted
     
-    toc_html = tag('h3 style="color: #555" id="toc"')+'Table of Contents'+endtag('h3')
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.reset()
+    
+    def reset(self, link_to_toc: bool = False, prerender: bool = False, header_ids: bool = False):
+        self.link_to_toc = link_to_toc
+        self.prerender = prerender
+        self.header_ids = header_ids
+        self.header_list = []
     
-    header_list = []
-    skip_first = 1
-    tag_number = 1
+    def block_code(self, code, lang=None):
+        if self.prerender:
+            if lang in HIGHLIGHT_PATTERNS:
+                return highlight_code(code.rstrip('\n'), lang)
+            if lang == 'mermaid':
+                diagram_html = render_diagram(code)
+                if diagram_html is not None:
+                    return diagram_html
+        return super().block_code(code, lang)
     
-    for header in soup.findAll(['h1', 'h2', 'h3', 'h4']):
-        header_string = header.string.replace('\n','').replace('\t','').strip().replace(' ','_').replace('.','_').lower()
-        header['id'] = header_string
-        header_list.append((header.string, header['id']))
+    def header(self, text, level, raw=None):
+        if level > 4:
+            return super().header(text, level, raw)
         
-        if header.name=='h1':
-            indent = 'margin-left: 0px;'
-        elif header.name=='h2':
-            indent = 'margin-left: 20px;'
-        elif header.name=='h3':
-            indent = 'margin-left: 40px;'
-        elif header.name=='h4':
-            indent = 'margin-left: 60px;'
+        header_string = get_header_string(text)
+        header_id = get_header_id(header_string)
+        self.header_list.append((header_string, header_id, level))
         
-        # link back to toc
-        if tag_number > skip_first:
-            new_tag = soup.new_tag("a")
-            new_tag.attrs['style'] = "font-size: 10px; color: #555;"
-            new_tag.attrs['href'] = "#toc"
-            new_tag.append("TOC")
-            br_tag = soup.new_tag("br")
-            header.insert_after(br_tag)
-            header.insert_after(new_tag)
+        if not self.link_to_toc and not self.header_ids:
+            return super().header(text, level, raw)
         
-        toc_html = toc_html + tag('p style="margin-top:0px; margin-bottom: 0px; '+indent+'"') + tag('a style="color: #333; " '+f'''href="#{header['id']}"''') + header.string + endtag('a') + endtag('p') +'\n'
+        import mistune
+        html = tag(f'h{level} id="{mistune.escape(header_id, quote=True)}"') + text + endtag(f'h{level}') + '\n'
+        if not self.link_to_toc:
+            return html
         
-        tag_number += 1
-    
-    toc_html = toc_html + tag('br') + '\n'
+        # link back to toc, except from the first header
+        if len(self.header_list) > 1:
+            html += tag('a style="font-size: 10px; color: #555;" href="#toc"') + 'TOC' + endtag('a') + tag('br') + '\n'
+        
+        return html
+
+
+def create_toc(html: str, header_list: list) -> str:
     
     toc_tag = '[TOC]'
-    html = soup.prettify(formatter="html5").replace(toc_tag, toc_html, 1)
+    html = html.replace(toc_tag, get_toc_html(header_list), 1)
     
-    # generate cross-reference links to headers
-    for header in header_list:
-        cross_ref_tag = '['+header[0].replace('\n','').replace('\t','').strip()+']'
-        cross_ref_html = tag('a style="color: #555; text-decoration: none;" '+f'''href="#{header[1]}"''') + header[0] + endtag('a')
-        html = html.replace(cross_ref_tag, cross_ref_html)
+    # generate cross-reference links to headers, all in a single pass over the document
+    cross_refs = {}
+    for (header_string, header_id, level) in header_list:
+        cross_ref_tag = get_cross_ref_tag(header_string)
+        if cross_ref_tag not in cross_refs:
+            cross_refs[cross_ref_tag] = tag('a style="color: #555; text-decoration: none;" '+f'href="#{header_id}"') + header_string + endtag('a')
+    html = replace_all(html, cross_refs)
         
     return html
+
+
+def get_toc_html(header_list: list) -> str:
+    toc_html = tag('h3 style="color: #555" id="toc"')+'Table of Contents'+endtag('h3')
+    
+    for (header_string, header_id, level) in header_list:
+        indent = f'margin-left: {(level - 1) * 20}px;'
+        toc_html = toc_html + tag('p style="margin-top:0px; margin-bottom: 0px; '+indent+'"') + tag('a style="color: #333; " '+f'href="#{header_id}"') + header_string + endtag('a') + endtag('p') +'\n'
+    
+    return toc_html + tag('br') + '\n'
+
+
+def get_header_string(text: str) -> str:
+    return unescape(re.sub('<[^>]*>', '', text))
+
+
+def get_header_id(header_string: str) -> str:
+    return header_string.replace('\n','').replace('\t','').strip().replace(' ','_').replace('.','_').lower()
+
+
+def get_cross_ref_tag(header_string: str) -> str:
+    return '['+header_string.replace('\n','').replace('\t','').strip()+']'
+"""
+#### 4.1 Cross-referencing other files
+
+With the cross-reference flag, a header can also be referenced from the other files that are converted together with it.
+
+This takes two passes over the files:
+
+1. A quick pass only looks for the headers of every file, and the strings in square brackets that could reference one.
+The markdown is split into blocks exactly like the converter does, so that the same headers are found, but only the text of the headers is converted.
+2. While a file is converted, every string in square brackets that is the header of a file is linked to it, except in the code blocks.
+A header of the file itself wins over the headers of other files, and otherwise the first file that has the header wins.
+
+With cross-referencing, every header down to level 4 gets an id, even when there is no table of contents.
+"""
+def extract_symbols(code: str, code_file_path: str) -> tuple:
+    import mistune
+    pre_html = convert_blocks(code, code_file_path)
+    
+    # Split the markdown into blocks like the converter does, and only convert the text of the headers
+    markdown = get_markdown()
+    tokens = markdown.block(mistune.preprocessing(pre_html))
+    markdown.block.tokens = []
+    markdown.inline.setup(markdown.block.def_links, markdown.block.def_footnotes)
+    
+    headers = []
+    for token in tokens:
+        if token['type'] == 'heading' and token['level'] <= 4:
+            header_string = get_header_string(markdown.inline(token['text']))
+            headers.append([header_string, get_header_id(header_string), token['level']])
+    
+    markdown.block.def_links = {}
+    markdown.block.def_footnotes = {}
+    markdown.inline.links = {}
+    markdown.inline.footnotes = {}
+    
+    cross_ref_tags = sorted(set(re.findall(r'\[[^\[\]\n]*\]', code)))
+    return (headers, cross_ref_tags)
+
+
+def get_symbols(code_files: list, indexed_files: dict) -> dict:
+    # Every header and where it can be found, in the order of the files
+    symbols = {}
+    for code_file_path in code_files:
+        html_file_path = get_html_file_path(code_file_path)
+        for (header_string, header_id, level) in indexed_files[code_file_path][3]:
+            symbols.setdefault(get_cross_ref_tag(header_string), []).append([html_file_path, header_id, header_string])
+    return symbols
+
+
+def link_symbols(html: str, symbols: dict, html_file_path: str) -> str:
+    html_dir = os.path.dirname(html_file_path)
+    
+    def link(match):
+        places = symbols.get(match.group())
+        if places is None:
+            return match.group()
+        (target_file_path, header_id, header_string) = next((place for place in places if place[0] == html_file_path), places[0])
+        if target_file_path == html_file_path:
+            href = f'#{header_id}'
+        else:
+            href = os.path.relpath(target_file_path, html_dir or '.').replace(os.sep, '/') + f'#{header_id}'
+        return tag('a style="color: #555; text-decoration: none;" '+f'href="{href}"') + header_string + endtag('a')
+    
+    # The code blocks are left as they are, square brackets in code are not references
+    return re.sub(r'<pre>[\s\S]*?</pre>|\[[^\[\]\n]*\]', link, html)
 """
 ## Some handy functions
 
@@ -563,11 +1357,17 @@ def endtag(element_name: str) -> str:
     return u'<' + '/' + element_name + u'>'
 
 
-def replace_every_nth(original_string: str, substring_to_replace: str, replace_with: str, nth: int) -> str:
-    new_string = re.sub(f'({substring_to_replace})',
-                        lambda m,
-                        c = itertools.count(): m.group() if next(c) % nth else replace_with, original_string)
-    return new_string
+def replace_all(original_string: str, replacements: dict) -> str:
+    if not replacements:
+        return original_string
+    # Longest first, so that when one string is the start of another, the longer one wins
+    pattern = re.compile('|'.join(re.escape(old) for old in sorted(replacements, key=len, reverse=True)))
+    return pattern.sub(lambda match: replacements[match.group()], original_string)
+
+
+def mix_in(mixin: type, base: type) -> type:
+    # The methods of the mixin on top of a base class from a module that is only imported when it is needed
+    return type(mixin.__name__, (mixin, base), {})
 
 
 def unescape(escaped: str) -> str:
@@ -577,13 +1377,41 @@ def unescape(escaped: str) -> str:
     return unescaped
 
 
-def save_as(content, file_path):
-    if not os.path.exists(os.path.dirname(file_path)):
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+def hash_file(file_path: str) -> str:
+    file = open(file_path, 'rb')
+    digest = hashlib.sha1(file.read()).hexdigest()
+    file.close()
+    return digest
+
+
+def save_as(content, file_path) -> bool:
+    # Text is saved as utf-8 with the line endings of the platform, as a file opened as text would have it, and bytes as they are
+    if isinstance(content, str):
+        content = (content if os.linesep == '\n' else content.replace('\n', os.linesep)).encode('utf-8')
+    
+    # The file is left alone when it already has these bytes; it is only read when it has the same size
+    try:
+        if os.stat(file_path).st_size == len(content):
+            file = open(file_path, 'rb')
+            unchanged = file.read() == content
+            file.close()
+            if unchanged:
+                return False
+    except OSError:
+        pass
     
-    file = open(file_path, 'w+', encoding='utf-8')
+    # Written next to the file and renamed over it, so that the file is never seen half-written.
+    # The folder is only made when the temporary file can not be opened, which saves checking for it every time.
+    temp_file_path = f'{file_path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    try:
+        file = open(temp_file_path, 'wb')
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file = open(temp_file_path, 'wb')
     file.write(content)
-    file.close() 
+    file.close()
+    os.replace(temp_file_path, file_path)
+    return True
 """
 ## The main functions
 
@@ -601,6 +1429,12 @@ For example:
 
 > mindoc -w example.py
 
+Only the files that changed are rebuilt, and new files that match the path are picked up too.
+On Linux, mindoc is told about changes by the operating system (inotify) as soon as they happen.
+Elsewhere, or with the poll flag (--poll), the files are checked every half a second; use the interval option (-i) to change that.
+
+> mindoc -w --poll -i 2 ./src/*.py
+
 ### Output
 
 * The output documentation .html file name will be the same as the code file.
@@ -615,68 +1449,1463 @@ Unless the code file is in the src folder, then the documentation will be saved
 
 > ./src/awesome.py -> ./docs/awesome.html
 
+### Building in parallel
+
+Each file is converted independently, so a large set of files can be spread over several processes with the jobs option (-j).
+Use -j 0 to use all the cores of the machine.
+
+> mindoc -j 8 ./src/*.py
+
+The files are handed out to the processes in chunks and the progress is still printed in the original order.
+
+Reading, converting and saving overlap, so that waiting for the disk, e.g. a network drive, does not hold up the conversion:
+READ_THREADS threads read the next code files (up to READ_AHEAD of them) while the current one is converted, and SAVE_THREADS threads save the pages in the background.
+
+Every page is first written to a temporary file next to it, and then renamed over the old page in one step.
+A browser or a web server that reads the page at the same time gets either the old page or the new one, never half a page.
+
+### Finding the code files
+
+The paths can be code files, folders or glob patterns, as many as needed:
+
+> mindoc ./src './sql/**/*.sql' README.md
+
+* A folder is searched for .py, .sql and .md files, in all its subfolders too.
+* In a pattern, * matches within the name of a file or folder and ** matches any number of folders. Quote the pattern so that the shell leaves it alone.
+* The include (--include) and exclude (--exclude) options take patterns like the ones in .gitignore and can be given more than once, e.g. --exclude tests --exclude '*_test.py'.
+* Files and folders ignored by the .gitignore files of the repository are left out, unless the no gitignore flag (--no-gitignore) is used.
+* Version control folders, node_modules, virtual environments and other folders that never have documentation in them are not searched at all.
+
+Each path is searched in a single walk through the folders with os.scandir.
+The folders that are ignored, or that cannot match the pattern, are not even entered.
+A file that matches more than one path is only converted once.
 """
-def make_docs(code_files: list, print_production: bool):
+CODE_FILE_EXTENSIONS = ('.py', '.sql', '.md')
+
+IGNORED_DIRS = {'.git', '.hg', '.svn', 'node_modules', 'venv', '.venv', '__pycache__',
+                '.tox', '.nox', '.mypy_cache', '.pytest_cache', CACHE_DIR}
+
+
+def find_code_files(src_paths: list, filters: dict = None, visited_dirs: set = None) -> list:
+    if isinstance(src_paths, str):
+        src_paths = [src_paths]
+    if filters is None:
+        filters = {}
+    include_rules = [compile_ignore_rule(pattern) for pattern in filters.get('include', [])]
+    exclude_rules = [compile_ignore_rule(pattern) for pattern in filters.get('exclude', [])]
+    
+    code_files = []
+    found_files = set()
+    for src_path in src_paths:
+        for code_file_path in walk_code_files(src_path, exclude_rules, filters.get('gitignore', True), visited_dirs):
+            found_file = os.path.normcase(os.path.abspath(code_file_path))
+            if found_file in found_files:
+                continue
+            if include_rules and not is_ignored(get_rule_path(code_file_path), False, include_rules):
+                continue
+            found_files.add(found_file)
+            code_files.append(code_file_path)
+    return code_files
+
+
+def walk_code_files(src_path: str, exclude_rules: list, use_gitignore: bool, visited_dirs: set = None):
+    if os.path.isfile(src_path):
+        if visited_dirs is not None:
+            visited_dirs.add(os.path.normpath(os.path.dirname(src_path) or '.'))
+        if src_path.endswith(CODE_FILE_EXTENSIONS) and not is_ignored(get_rule_path(src_path), False, exclude_rules):
+            yield src_path
+        return
+    
+    # Walk from the folder the pattern starts in; a folder is the same as folder/**/*
+    if os.path.isdir(src_path):
+        (base_dir, segments) = (src_path, ['**', '*'])
+    else:
+        parts = src_path.replace(os.sep, '/').split('/')
+        magic_parts = [n for (n, part) in enumerate(parts) if re.search(r'[*?[]', part)]
+        if not magic_parts:
+            if visited_dirs is not None and os.path.isdir(os.path.dirname(src_path) or '.'):
+                visited_dirs.add(os.path.normpath(os.path.dirname(src_path) or '.'))
+            return
+        base_dir = '/'.join(parts[:magic_parts[0]])
+        segments = parts[magic_parts[0]:]
+        if base_dir == '' and src_path.startswith('/'):
+            base_dir = '/'
+        if not os.path.isdir(base_dir or '.'):
+            return
+    
+    segment_patterns = [None if segment == '**' else re.compile(translate_pattern(segment)) for segment in segments]
+    gitignore_rules = get_parent_gitignore_rules(base_dir or '.') if use_gitignore else []
+    
+    def match_segments(states: set, name: str) -> set:
+        # The states are the numbers of the segments that are still to be matched, like a small automaton
+        next_states = set()
+        for state in states:
+            if state == len(segments) or (name.startswith('.') and not segments[state].startswith('.')):
+                continue
+            if segment_patterns[state] is None:
+                next_states.add(state)
+            elif segment_patterns[state].fullmatch(name):
+                next_states.add(state + 1)
+        return skip_globstars(next_states)
+    
+    def skip_globstars(states: set) -> set:
+        states = set(states)
+        for state in sorted(states):
+            while state < len(segments) and segment_patterns[state] is None:
+                state += 1
+                states.add(state)
+        return states
+    
+    def walk(dir_path: str, states: set, gitignore_rules: list):
+        try:
+            entries = sorted(os.scandir(dir_path or '.'), key=lambda entry: entry.name)
+        except OSError:
+            return
+        names = set(entry.name for entry in entries)
+        if 'pyvenv.cfg' in names:
+            # A virtual environment
+            return
+        if visited_dirs is not None:
+            visited_dirs.add(os.path.normpath(dir_path or '.'))
+        
+        absolute_dir = os.path.abspath(dir_path or '.').replace(os.sep, '/')
+        if use_gitignore and '.gitignore' in names:
+            gitignore_rules = gitignore_rules + load_gitignore_rules(absolute_dir)
+        
+        sub_dirs = []
+        for entry in entries:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and entry.name in IGNORED_DIRS:
+                continue
+            next_states = match_segments(states, entry.name)
+            if is_dir:
+                next_states.discard(len(segments))
+            elif len(segments) not in next_states or not entry.name.endswith(CODE_FILE_EXTENSIONS):
+                continue
+            if not next_states:
+                continue
+            
+            path = os.path.join(dir_path, entry.name)
+            if is_ignored(get_rule_path(path), is_dir, exclude_rules):
+                continue
+            if is_ignored(absolute_dir + '/' + entry.name, is_dir, gitignore_rules):
+                continue
+            
+            if is_dir:
+                sub_dirs.append((path, next_states))
+            else:
+                yield path
+        
+        for (sub_dir_path, sub_dir_states) in sub_dirs:
+            yield from walk(sub_dir_path, sub_dir_states, gitignore_rules)
+    
+    yield from walk(base_dir, skip_globstars({0}), gitignore_rules)
+"""
+The patterns of .gitignore files, and of the include and exclude options, follow the rules of git:
+
+* A pattern with a / at the start or in the middle only matches from the folder of the .gitignore file (or from the current folder), otherwise it matches a name in any folder.
+* A pattern with a / at the end only matches folders.
+* A pattern that starts with ! includes again what an earlier pattern ignored, and the last pattern that matches wins.
+
+The .gitignore files of the folders above the path, up to the top of the repository, count too.
+"""
+def compile_ignore_rule(pattern: str, base_dir: str = '') -> tuple:
+    negate = pattern.startswith('!')
+    if negate or pattern.startswith('\\'):
+        pattern = pattern[1:]
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    anchored = '/' in pattern
+    regex = translate_pattern(pattern.lstrip('/'))
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    prefix = base_dir.rstrip('/') + '/' if base_dir else ''
+    return (prefix, re.compile(regex), negate, dir_only)
+
+
+def translate_pattern(pattern: str) -> str:
+    regex = ''
+    position = 0
+    while position < len(pattern):
+        if pattern.startswith('**/', position):
+            regex += '(?:.*/)?'
+            position += 3
+        elif pattern.startswith('**', position):
+            regex += '.*'
+            position += 2
+        elif pattern[position] == '*':
+            regex += '[^/]*'
+            position += 1
+        elif pattern[position] == '?':
+            regex += '[^/]'
+            position += 1
+        elif pattern[position] == '[' and pattern.find(']', position + 2) > 0:
+            end = pattern.find(']', position + 2)
+            characters = pattern[position + 1:end]
+            if characters.startswith('!'):
+                characters = '^' + characters[1:]
+            regex += '[' + characters.replace('\\', '\\\\') + ']'
+            position = end + 1
+        else:
+            regex += re.escape(pattern[position])
+            position += 1
+    return regex
+
+
+def is_ignored(path: str, is_dir: bool, rules: list) -> bool:
+    ignored = False
+    for (prefix, regex, negate, dir_only) in rules:
+        if (dir_only and not is_dir) or not path.startswith(prefix):
+            continue
+        if regex.fullmatch(path[len(prefix):]):
+            ignored = not negate
+    return ignored
+
+
+def get_rule_path(path: str) -> str:
+    # The include and exclude patterns match the path as it was given, e.g. src/awesome.py
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def load_gitignore_rules(dir_path: str) -> list:
+    try:
+        file = open(os.path.join(dir_path, '.gitignore'), 'r', encoding='utf-8', errors='replace')
+    except OSError:
+        return []
+    lines = file.read().splitlines()
+    file.close()
+    
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if line and not line.startswith('#'):
+            rules.append(compile_ignore_rule(line, dir_path))
+    return rules
+
+
+def get_parent_gitignore_rules(dir_path: str) -> list:
+    # The .gitignore files from the top of the repository down to the folder above the path
+    if os.path.exists(os.path.join(dir_path, '.git')):
+        return []
+    parent_dirs = []
+    current_dir = os.path.dirname(os.path.abspath(dir_path))
+    while True:
+        parent_dirs.append(current_dir)
+        if os.path.exists(os.path.join(current_dir, '.git')):
+            break
+        if os.path.dirname(current_dir) == current_dir:
+            # Not in a repository
+            return []
+        current_dir = os.path.dirname(current_dir)
+    
+    rules = []
+    for parent_dir in reversed(parent_dirs):
+        rules += load_gitignore_rules(parent_dir.replace(os.sep, '/'))
+    return rules
+
+
+def make_doc(code_file_path: str, options: dict = None, symbols: dict = None) -> dict:
+    (doc, pages) = convert_doc(read_source(code_file_path), options, symbols)
+    return save_doc(doc, pages, options)
+
+
+def read_source(code_file_path: str) -> tuple:
+    start_time = time.perf_counter()
+    code = get_code(code_file_path)
+    return (code_file_path, code, time.perf_counter() - start_time)
+
+
+def convert_doc(source: tuple, options: dict = None, symbols: dict = None) -> tuple:
+    if options is None:
+        options = {}
+    (code_file_path, code, read_seconds) = source
+    seconds = {'read': read_seconds}
+    
+    html = convert_code(code, code_file_path, options, seconds, symbols)
+    html_file_path = get_html_file_path(code_file_path)
+    
+    doc = {'code_file': code_file_path, 'html_file': html_file_path,
+           'code_size': len(code), 'html_size': len(html), 'seconds': seconds}
+    if 'index' in options:
+        doc['title'] = get_doc_title(code_file_path, get_markdown().renderer.header_list)
+        doc['terms'] = get_search_terms(code)
+    
+    # Splitting the page and moving out its code is counted with the table of contents, the last step of putting the page together
+    start_time = time.perf_counter()
+    pages = get_pages(html, html_file_path, options, get_markdown().renderer.header_list)
+    seconds['toc'] += time.perf_counter() - start_time
+    return (doc, pages)
+
+
+def save_doc(doc: dict, pages: list, options: dict = None) -> dict:
+    if options is None:
+        options = {}
+    start_time = time.perf_counter()
+    saved_files = []
+    for (page_file_path, page) in pages:
+        save_as(page, page_file_path)
+        saved_files.append(page_file_path)
+        if options.get('compress', False):
+            save_compressed(page, page_file_path)
+            saved_files += [page_file_path + extension for extension in COMPRESSED_EXTENSIONS if os.path.exists(page_file_path + extension)]
+    doc['saved_files'] = saved_files
+    with save_lock:
+        # Only done once for each docs folder, by one thread
+        if options.get('external_assets', False):
+            save_assets(os.path.dirname(doc['html_file']))
+        if 'offline' in options:
+            save_vendor_files(get_vendor_copy(options, doc['html_file']), options['offline'])
+    doc['seconds']['save'] = time.perf_counter() - start_time
+    return doc
+
+
+def remove_old_files(old_files: list, saved_files: list):
+    # The parts, code scripts and compressed copies of a page that were not saved again
+    for file_path in set(old_files) - set(saved_files):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def convert_code(code: str, code_file_path: str, options: dict = None, seconds: dict = None, symbols: dict = None) -> str:
+    if seconds is None:
+        seconds = {}
+    
+    start_time = time.perf_counter()
+    pre_html = convert_blocks(code, code_file_path)
+    seconds['blocks'] = time.perf_counter() - start_time
+    
+    return convert_to_html(pre_html, options, seconds, symbols, get_html_file_path(code_file_path))
+
+
+def convert_blocks(code: str, code_file_path: str) -> str:
+    if code_file_path.endswith('.py'):
+        return convert_python_blocks(code)
+    elif code_file_path.endswith('.sql'):
+        return convert_sql_blocks(code)
+    elif code_file_path.endswith('.md'):
+        return code
+    else:
+        print('File type not supported')
+        return ''
+
+def get_html_file_path(code_file_path: str) -> str:
+    (dir_path, file_name) = os.path.split(code_file_path)
+    
+    if file_name.endswith('.md'):
+        if dir_path == '':
+            dir_path = '.'
+        doc = '/'
+    elif dir_path == '':
+        doc = './docs/'
+    elif dir_path.endswith('src'):
+        dir_path = dir_path[:-3]+'docs/'
+        doc = ''
+    else:
+        doc = '/docs/'
+    
+    return dir_path + doc + file_name.replace('.py', '.html').replace('.sql', '.html').replace('.md', '.html')
+
+
+def make_docs(code_files: list, print_production: bool, jobs: int = 1, cache_dir: str = None, options: dict = None) -> list:
+    if options and 'offline' in options:
+        # Part of the options, so that every page is built again when the docs have to find the scripts somewhere else
+        options = dict(options, vendor_copy=get_vendor_copy_dir(code_files))
+    
+    symbols = None
+    changed_symbols = set()
+    if options and options.get('xref', False):
+        indexed_files = {} if cache_dir is None else load_symbol_index(cache_dir)
+        (indexed_files, symbols, changed_symbols) = index_symbols(code_files, indexed_files, jobs)
+        if cache_dir is not None:
+            save_symbol_index(cache_dir, indexed_files)
+    
+    search_entries = None
+    if options and 'index' in options:
+        search_entries = {} if cache_dir is None else load_search_entries(cache_dir)
+    
+    if cache_dir is None:
+        stale_files = code_files
+    else:
+        cached_files = load_manifest(cache_dir, options)
+        stale_files = []
+        for code_file_path in code_files:
+            cached = cached_files.get(code_file_path)
+            previous_state = None if cached is None else tuple(cached[:3])
+            old_files = cached[4] if cached is not None and len(cached) > 4 else []
+            source_state = get_source_state(code_file_path, previous_state)
+            references_changed = symbols is not None and not changed_symbols.isdisjoint(indexed_files[code_file_path][4])
+            search_entry_missing = search_entries is not None and search_entries.get(code_file_path, [None])[0] != source_state[2]
+            if (cached is not None and source_state[2] == cached[2] and os.path.exists(cached[3])
+                    and not references_changed and not search_entry_missing):
+                cached_files[code_file_path] = list(source_state) + [cached[3], old_files]
+            else:
+                cached_files[code_file_path] = list(source_state) + [None, old_files]
+                stale_files.append(code_file_path)
+    
+    docs = []
+    for doc in build_docs(stale_files, jobs, options, symbols):
+        if cache_dir is not None:
+            remove_old_files(cached_files[doc['code_file']][4], doc['saved_files'])
+            cached_files[doc['code_file']][3:] = [doc['html_file'], doc['saved_files']]
+        if search_entries is not None:
+            digest = None if cache_dir is None else cached_files[doc['code_file']][2]
+            search_entries[doc['code_file']] = [digest, doc['html_file'], doc['title'], doc['terms']]
+        if print_production:
+            print(f"Doc for {doc['code_file']} saved as {doc['html_file']}.")
+        docs.append(doc)
+    
+    if search_entries is not None:
+        save_site_index(options['index'], code_files, search_entries)
+        if print_production:
+            print(f"Index of {len(code_files)} docs saved as {os.path.join(options['index'], 'index.html')}.")
+    
+    if cache_dir is not None:
+        save_manifest(cache_dir, cached_files, options)
+        if search_entries is not None:
+            save_search_entries(cache_dir, code_files, search_entries)
+        if print_production and len(stale_files) < len(code_files):
+            print(f'{len(code_files) - len(stale_files)} docs already up to date.')
+    
+    return docs
+
+
+READ_THREADS = 4
+READ_AHEAD = 16
+SAVE_THREADS = 4
+SAVE_QUEUE_SIZE = 16
+
+save_lock = threading.Lock()
+
+
+def build_docs(code_files: list, jobs: int, options: dict = None, symbols: dict = None):
+    if not code_files:
+        return
+    
+    # The pages are saved by a few threads while the next files are converted, and given back in the original order once they are saved
+    import concurrent.futures
+    converted = map_files(functools.partial(convert_doc, options=options, symbols=symbols), read_sources(code_files), jobs, len(code_files))
+    saving_docs = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(SAVE_THREADS) as save_pool:
+        for (doc, pages) in converted:
+            saving_docs.append(save_pool.submit(save_doc, doc, pages, options))
+            while saving_docs and (saving_docs[0].done() or len(saving_docs) > SAVE_QUEUE_SIZE):
+                yield saving_docs.popleft().result()
+        while saving_docs:
+            yield saving_docs.popleft().result()
+
+
+def read_sources(code_files: list):
+    # A few threads read the code files ahead of the conversion, at most READ_AHEAD files at a time
+    import concurrent.futures
+    reading_files = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(READ_THREADS) as read_pool:
+        for code_file_path in code_files:
+            reading_files.append(read_pool.submit(read_source, code_file_path))
+            if len(reading_files) >= READ_AHEAD:
+                yield reading_files.popleft().result()
+        while reading_files:
+            yield reading_files.popleft().result()
+
+
+def map_files(function, code_files, jobs: int, file_count: int = None):
+    if file_count is None:
+        file_count = len(code_files)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, file_count)
+    
+    if jobs > 1:
+        # Hand out the files in chunks so that each worker gets a few files at a time,
+        # while imap still yields the results in the original order.
+        chunk_size = max(1, file_count // (jobs * 4))
+        import multiprocessing
+        with multiprocessing.Pool(jobs) as pool:
+            yield from pool.imap(function, code_files, chunk_size)
+    else:
+        for code_file_path in code_files:
+            yield function(code_file_path)
+"""
+### Build cache
+
+mindoc remembers what it built in a cache folder, .mindoc-cache in the current directory.
+
+For every code file, the manifest records the modification time, the size and the content hash of the code file, and where its documentation was saved, including every page, code script and compressed copy.
+On the next run, a code file is skipped entirely when its content hash is unchanged, its documentation still exists, and the manifest was written by the same version of mindoc with the same options.
+As with the watch mode, the code file is only read and hashed when its modification time or size changed.
+
+Use the no cache flag (--no-cache) to rebuild everything.
+"""
+def load_manifest(cache_dir: str, options: dict = None) -> dict:
+    manifest = load_cache_file(cache_dir, 'manifest.json')
+    cached_files = manifest.get('files', {})
+    if manifest.get('options') != (options or {}):
+        # Every file is rebuilt, but the files its doc was saved as are still needed to remove the ones that are not saved again
+        return {code_file_path: [None, None, None, None] + cached[4:] for (code_file_path, cached) in cached_files.items()}
+    return cached_files
+
+
+def save_manifest(cache_dir: str, cached_files: dict, options: dict = None):
+    manifest = {'version': __version__, 'options': options or {}, 'files': cached_files}
+    save_as(json.dumps(manifest, sort_keys=True), os.path.join(cache_dir, 'manifest.json'))
+
+
+def load_cache_file(cache_dir: str, file_name: str) -> dict:
+    cache_file_path = os.path.join(cache_dir, file_name)
+    if not os.path.exists(cache_file_path):
+        return {}
+    
+    file = open(cache_file_path, 'r', encoding='utf-8')
+    try:
+        content = json.load(file)
+    except ValueError:
+        content = {}
+    file.close()
+    
+    if content.get('version') != __version__:
+        return {}
+    return content
+"""
+With the cross-reference flag, the headers found in the first pass are kept in the cache folder too, in symbols.json, together with the modification time, the size and the content hash of each code file.
+Only the code files that changed are looked at again.
+
+A code file whose content did not change is still rebuilt when one of the strings in square brackets in it now links somewhere else, e.g. because another file got, lost or moved the header.
+"""
+def load_symbol_index(cache_dir: str) -> dict:
+    return load_cache_file(cache_dir, 'symbols.json').get('files', {})
+
+
+def save_symbol_index(cache_dir: str, indexed_files: dict):
+    # Not sorted, as the order of the files decides which file wins when several have the same header
+    index = {'version': __version__, 'files': indexed_files}
+    save_as(json.dumps(index), os.path.join(cache_dir, 'symbols.json'))
+
+
+def index_symbols(code_files: list, indexed_files: dict, jobs: int = 1) -> tuple:
+    previous_symbols = get_symbols([code_file_path for code_file_path in indexed_files], indexed_files)
+    
+    new_indexed_files = {}
+    stale_files = []
     for code_file_path in code_files:
-        code = get_code(code_file_path)
-        if code_file_path.endswith('.py'):
-            pre_html = convert_python_blocks(code)
-        elif code_file_path.endswith('.sql'):
-            pre_html = convert_sql_blocks(code)
-        elif code_file_path.endswith('.md'):
-            pre_html = code
+        indexed = indexed_files.get(code_file_path)
+        previous_state = None if indexed is None else tuple(indexed[:3])
+        source_state = get_source_state(code_file_path, previous_state)
+        if indexed is not None and source_state[2] == indexed[2]:
+            new_indexed_files[code_file_path] = list(source_state) + indexed[3:]
         else:
-            print('File type not supported')
-            pre_html = ''
-        html = convert_to_html(pre_html)
+            new_indexed_files[code_file_path] = list(source_state) + [None, None]
+            stale_files.append(code_file_path)
+    
+    for (code_file_path, (headers, cross_ref_tags)) in zip(stale_files, map_files(extract_file_symbols, stale_files, jobs)):
+        new_indexed_files[code_file_path][3:] = [headers, cross_ref_tags]
+    
+    symbols = get_symbols(code_files, new_indexed_files)
+    changed_symbols = set(cross_ref_tag for cross_ref_tag in symbols.keys() | previous_symbols.keys()
+                          if symbols.get(cross_ref_tag) != previous_symbols.get(cross_ref_tag))
+    return (new_indexed_files, symbols, changed_symbols)
+
+
+def extract_file_symbols(code_file_path: str) -> tuple:
+    return extract_symbols(get_code(code_file_path), code_file_path)
+"""
+### Index and search
+
+With the index option (--index), an index.html page listing every document, with a search box, is saved in the given folder.
+
+> mindoc --index docs ./src/*.sql
+
+The search runs in the browser, without loading the documents themselves:
+
+* Every word of every code file, documentation and code, goes into a prebuilt inverted index, which lists the documents each word appears in.
+* Words with underscores are also split into their parts, so orders_fact is found by orders_fact, orders and fact.
+* The index is split into small script files in the search folder next to index.html, one for each first letter, and the page only loads the ones for the words typed in.
+Script files rather than .json files, so that the search also works when index.html is opened straight from the disk.
+
+The title and the words of every document are kept in the cache folder, in search.json, so only the documents that are rebuilt are read again.
+Only the parts of the index whose content changed are saved again.
+"""
+SEARCH_DIR = 'search'
+
+
+def get_doc_title(code_file_path: str, header_list: list) -> str:
+    for (header_string, header_id, level) in header_list:
+        if level == 1:
+            return header_string.strip()
+    if header_list:
+        return header_list[0][0].strip()
+    return os.path.basename(code_file_path)
+
+
+def get_search_terms(code: str) -> list:
+    terms = set(re.findall(r'[a-z_][a-z0-9_]+', code.lower()))
+    for term in list(terms):
+        if '_' in term:
+            terms.update(part for part in term.split('_') if len(part) > 1)
+    return sorted(terms)
+
+
+def load_search_entries(cache_dir: str) -> dict:
+    return load_cache_file(cache_dir, 'search.json').get('files', {})
+
+
+def save_search_entries(cache_dir: str, code_files: list, search_entries: dict):
+    files = {code_file_path: search_entries[code_file_path] for code_file_path in code_files if code_file_path in search_entries}
+    save_as(json.dumps({'version': __version__, 'files': files}), os.path.join(cache_dir, 'search.json'))
+
+
+def save_site_index(index_dir: str, code_files: list, search_entries: dict):
+    documents = []
+    shards = {}
+    for code_file_path in code_files:
+        if code_file_path not in search_entries:
+            continue
+        (digest, html_file_path, title, terms) = search_entries[code_file_path]
+        href = os.path.relpath(html_file_path, index_dir).replace(os.sep, '/')
+        for term in terms:
+            shards.setdefault(term[0], {}).setdefault(term, []).append(len(documents))
+        documents.append([href, title, code_file_path])
+    
+    search_dir = os.path.join(index_dir, SEARCH_DIR)
+    for (letter, shard) in shards.items():
+        save_as(f'mindocSearch.add("{letter}", ' + json.dumps(shard, separators=(',', ':'), sort_keys=True) + ');\n',
+                os.path.join(search_dir, f'{letter}.js'))
+    if os.path.isdir(search_dir):
+        for file_name in os.listdir(search_dir):
+            if file_name.endswith('.js') and file_name[:-len('.js')] not in shards:
+                os.remove(os.path.join(search_dir, file_name))
+    
+    save_as(get_index_page(documents, ''.join(sorted(shards))), os.path.join(index_dir, 'index.html'))
+
+
+def get_index_page(documents: list, letters: str) -> str:
+    import mistune
+    (page_start, page_end) = get_page_shell(uses_prettify=False, uses_math=False, uses_mermaid=False)
+    
+    body = tag('h1') + 'Index' + endtag('h1') + '\n'
+    body += tag('input id="search" type="search" placeholder="Search" autofocus style="width: 100%; padding: 5px; font-size: 16px;"') + '\n'
+    body += tag('div id="results"') + endtag('div') + '\n'
+    body += tag('div id="documents"') + '\n'
+    for (href, title, code_file_path) in documents:
+        body += (tag('p style="margin-top:0px; margin-bottom: 0px;"') + tag(f'a style="color: #333; " href="{mistune.escape(href, quote=True)}"')
+                 + mistune.escape(title) + endtag('a') + ' ' + tag('span style="color: #999; font-size: 12px;"')
+                 + mistune.escape(code_file_path) + endtag('span') + endtag('p') + '\n')
+    body += endtag('div') + '\n'
+    
+    search_script = """
+        var mindocSearch = {
+            documents: DOCUMENTS,
+            letters: "LETTERS",
+            shards: {},
+            add: function (letter, shard) {
+                this.shards[letter] = shard;
+                this.run();
+            },
+            load: function (letter) {
+                if (letter in this.shards || this.letters.indexOf(letter) < 0) { return; }
+                this.shards[letter] = null;
+                var script = document.createElement("script");
+                script.src = "SEARCH_DIR/" + letter + ".js";
+                document.head.appendChild(script);
+            },
+            find: function (word) {
+                // Every document with a word that starts with the typed word
+                var shard = this.shards[word[0]], found = {};
+                for (var term in shard || {}) {
+                    if (term.lastIndexOf(word, 0) === 0) {
+                        shard[term].forEach(function (number) { found[number] = true; });
+                    }
+                }
+                return found;
+            },
+            run: function () {
+                var words = document.getElementById("search").value.toLowerCase().match(/[a-z0-9_]+/g) || [];
+                for (var i = 0; i < words.length; i++) {
+                    this.load(words[i][0]);
+                }
+                for (var i = 0; i < words.length; i++) {
+                    // Still loading, the search runs again when it is loaded
+                    if (this.shards[words[i][0]] === null) { return; }
+                }
+                
+                var results = document.getElementById("results");
+                results.innerHTML = "";
+                document.getElementById("documents").style.display = words.length ? "none" : "";
+                var matches = null;
+                for (var i = 0; i < words.length; i++) {
+                    var found = this.find(words[i]);
+                    if (matches !== null) {
+                        for (var number in found) {
+                            if (!(number in matches)) { delete found[number]; }
+                        }
+                    }
+                    matches = found;
+                }
+                for (var number in matches) {
+                    var doc = this.documents[number];
+                    var p = document.createElement("p"), a = document.createElement("a"), span = document.createElement("span");
+                    p.style.margin = "0px";
+                    a.href = doc[0];
+                    a.textContent = doc[1];
+                    a.style.color = "#333";
+                    span.textContent = " " + doc[2];
+                    span.style.color = "#999";
+                    span.style.fontSize = "12px";
+                    p.appendChild(a);
+                    p.appendChild(span);
+                    results.appendChild(p);
+                }
+            }
+        };
+        document.getElementById("search").addEventListener("input", function () { mindocSearch.run(); });
+        """
+    search_script = replace_all(search_script, {
+        'DOCUMENTS': json.dumps(documents).replace('</', '<\\/'),
+        'LETTERS': letters,
+        'SEARCH_DIR': SEARCH_DIR,
+    })
+    return page_start + body + tag('script') + search_script + endtag('script') + page_end
+
+
+"""
+### Finding out what is slow
+
+Every doc that is built records how long each stage took and how big the code and the documentation are:
+
+* read: reading the code file
+* blocks: separating the documentation from the code
+* markdown: converting the markdown to html
+* cleanup: cleaning up the html and putting the page together
+* toc: the table of contents and cross-referencing
+* save: writing the documentation
+
+With the stats flag (--stats), a summary of the slowest files and of the time spent in each stage is printed at the end.
+The stats file option (--stats-file) saves the numbers of every file as a .json or .csv file.
+
+> mindoc --stats --stats-file stats.csv ./src/*.py
+
+To go deeper, the profile option (--profile) runs the whole build under cProfile and saves the profile as a .prof file, e.g. for snakeviz or pstats.
+With more than one job, the profile only covers the main process, so use it together with -j 1.
+"""
+STAGES = ['read', 'blocks', 'markdown', 'cleanup', 'toc', 'save']
+
+
+def print_stats(docs: list, top: int = 10):
+    if not docs:
+        print('No docs were built.')
+        return
+    
+    print(f'Slowest {min(top, len(docs))} of {len(docs)} docs (ms):')
+    print(' '.join(f'{stage:>9}' for stage in STAGES + ['total']) + f'{"size":>10}  file')
+    for doc in sorted(docs, key=lambda doc: sum(doc['seconds'].values()), reverse=True)[:top]:
+        columns = [doc['seconds'].get(stage, 0) * 1000 for stage in STAGES]
+        columns.append(sum(doc['seconds'].values()) * 1000)
+        print(' '.join(f'{column:>9.1f}' for column in columns) + f"{doc['html_size']:>10}  {doc['code_file']}")
+    
+    print('')
+    print('Time per stage:')
+    total_seconds = sum(sum(doc['seconds'].values()) for doc in docs) or 1
+    for stage in STAGES:
+        stage_seconds = sum(doc['seconds'].get(stage, 0) for doc in docs)
+        print(f'{stage:>9} {stage_seconds * 1000:>10.1f} ms {stage_seconds / total_seconds:>6.1%}')
+    print(f"{'total':>9} {total_seconds * 1000:>10.1f} ms")
+
+
+def save_stats(docs: list, stats_file_path: str):
+    rows = []
+    for doc in docs:
+        row = {'code_file': doc['code_file'], 'html_file': doc['html_file'],
+               'code_size': doc['code_size'], 'html_size': doc['html_size']}
+        for stage in STAGES:
+            row[stage] = doc['seconds'].get(stage, 0)
+        rows.append(row)
+    
+    if stats_file_path.endswith('.csv'):
+        import csv
+        stats_file = open(stats_file_path, 'w', encoding='utf-8', newline='')
+        writer = csv.DictWriter(stats_file, fieldnames=['code_file', 'html_file', 'code_size', 'html_size'] + STAGES)
+        writer.writeheader()
+        writer.writerows(rows)
+        stats_file.close()
+    else:
+        save_as(json.dumps(rows, indent=2), stats_file_path)
+
 
-        toc_tag = '[TOC]'
-        if toc_tag in html:
-            html = create_toc(html)
+"""
+### Using mindoc from python
+
+The documentation can also be made in memory, without reading or writing any files, e.g. to render it on demand in a web application:
+
+```python
+import mindoc
+
+result = mindoc.render(code, kind='sql')
+result.html      # the whole html page
+result.headings  # (header string, header id, level) of every header down to level 4
+result.toc       # the table of contents, as html
+```
+
+The kind is py, sql or md, and the options are the same as for make_docs, e.g. {'prerender': True}.
+With the external assets option, the page links to mindoc.css and mindoc.js, which are not saved; use save_assets for them.
+
+To read the code from a file-like object, e.g. an uploaded file or a pipe, and optionally write the html to another one:
+
+```python
+result = mindoc.render_stream(sys.stdin, kind='py', output_file=sys.stdout)
+```
+
+Either can be opened as text or in binary mode; bytes are read and written as utf-8.
+
+Both can be called from several threads, the conversions simply take turns.
+"""
+RenderResult = collections.namedtuple('RenderResult', ['html', 'headings', 'toc'])
+
+
+render_lock = threading.Lock()
+
+
+def render(source: str, kind: str = 'py', options: dict = None) -> RenderResult:
+    if kind == 'py':
+        pre_html = convert_python_blocks(source)
+    elif kind == 'sql':
+        pre_html = convert_sql_blocks(source)
+    elif kind == 'md':
+        pre_html = source
+    else:
+        raise ValueError(f'Unknown kind {kind!r}, expected py, sql or md')
+    
+    with render_lock:
+        html = convert_to_html(pre_html, options)
+        headings = list(get_markdown().renderer.header_list)
+    return RenderResult(html, headings, get_toc_html(headings))
+
+
+def render_stream(input_file, kind: str = 'py', output_file=None, options: dict = None) -> RenderResult:
+    source = input_file.read()
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    
+    result = render(source, kind, options)
+    if output_file is not None:
+        # A file opened in binary mode, e.g. sys.stdout.buffer, gets the page as utf-8
+        import io
+        if isinstance(output_file, (io.RawIOBase, io.BufferedIOBase)):
+            output_file.write(result.html.encode('utf-8'))
+        else:
+            output_file.write(result.html)
+    return result
+
+
+"""
+### Watching for changes
+
+With the watch flag, mindoc keeps an eye on the code files and only rebuilds the documentation of the files that actually changed.
+
+Every file is checked with a cheap `os.stat` call. Only when the modification time or the size differs is the file read and hashed, and only when the content hash differs is the documentation rebuilt.
+This way, saving a file without changing it (or touching it) does not trigger a rebuild.
+
+The time each rebuild took is reported.
+"""
+def get_source_state(code_file_path: str, previous_state: tuple = None) -> tuple:
+    stat = os.stat(code_file_path)
+    if previous_state is not None and previous_state[:2] == (stat.st_mtime_ns, stat.st_size):
+        return previous_state
+    return (stat.st_mtime_ns, stat.st_size, hash_file(code_file_path))
+
+
+def watch_docs(src_paths: list, interval: float, options: dict = None, poll: bool = False, filters: dict = None):
+    if options and 'offline' in options:
+        options = dict(options, vendor_copy=get_vendor_copy_dir(find_code_files(src_paths, filters)))
+    symbols = None
+    if options and options.get('xref', False):
+        (indexed_files, symbols, changed_symbols) = index_symbols(find_code_files(src_paths, filters), load_symbol_index(CACHE_DIR))
+    search_entries = None
+    if options and 'index' in options:
+        search_entries = load_search_entries(CACHE_DIR)
+    saved_files = {code_file_path: cached[4] for (code_file_path, cached) in load_manifest(CACHE_DIR, options).items() if len(cached) > 4}
+    
+    for changed_files in watch_changes(src_paths, interval, poll, filters):
+        if symbols is not None:
+            (indexed_files, symbols, changed_files) = update_symbols(find_code_files(src_paths, filters), indexed_files, changed_files)
+        for code_file_path in changed_files:
+            start_time = time.perf_counter()
+            doc = make_doc(code_file_path, options, symbols)
+            remove_old_files(saved_files.get(code_file_path, []), doc['saved_files'])
+            saved_files[code_file_path] = doc['saved_files']
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            print(f"Doc for {code_file_path} rebuilt as {doc['html_file']} in {elapsed_ms:.0f} ms.")
+            if search_entries is not None:
+                search_entries[code_file_path] = [None, doc['html_file'], doc['title'], doc['terms']]
+        if search_entries is not None:
+            save_site_index(options['index'], find_code_files(src_paths, filters), search_entries)
+
+
+def update_symbols(code_files: list, indexed_files: dict, changed_files: list) -> tuple:
+    # The files that link somewhere else now have to be rebuilt too
+    (indexed_files, symbols, changed_symbols) = index_symbols(code_files, indexed_files)
+    changed_files = changed_files + [code_file_path for code_file_path in code_files
+                                     if code_file_path not in changed_files and not changed_symbols.isdisjoint(indexed_files[code_file_path][4])]
+    return (indexed_files, symbols, changed_files)
+
+
+def watch_changes(src_paths: list, interval: float, poll: bool = False, filters: dict = None):
+    # Every folder that was searched is watched, so that new files in it are seen
+    watch_dirs = set()
+    code_files = find_code_files(src_paths, filters, watch_dirs)
+    source_states = {}
+    for code_file_path in code_files:
+        source_states[code_file_path] = get_source_state(code_file_path)
+    
+    watcher = None if poll else InotifyWatcher.create()
+    
+    while True:
+        if watcher is None:
+            time.sleep(interval)
+        else:
+            watcher.add_dirs(watch_dirs)
+            watcher.wait()
         
-        (dir_path, file_name) = os.path.split(code_file_path)
+        # Look for the files again, in case new ones have been created
+        watch_dirs = set()
+        code_files = find_code_files(src_paths, filters, watch_dirs)
+        changed_files = []
+        for code_file_path in code_files:
+            previous_state = source_states.get(code_file_path)
+            try:
+                source_state = get_source_state(code_file_path, previous_state)
+            except FileNotFoundError:
+                continue
+            source_states[code_file_path] = source_state
+            
+            if previous_state is None or source_state[2] != previous_state[2]:
+                changed_files.append(code_file_path)
         
-        if file_name.endswith('.md'):
-            if dir_path == '':
-                dir_path = '.'
-            doc = '/'
-        elif dir_path == '':
-            doc = './docs/'
-        elif dir_path.endswith('src'):
-            dir_path = dir_path[:-3]+'docs/'
-            doc = ''
-        else:
-            doc = '/docs/'
+        if changed_files:
+            yield changed_files
+
+
+"""
+#### Being told about changes
+
+On Linux, the folders searched for the code files are watched with inotify through ctypes, so there is no need for any extra package.
+The watch mode then sleeps until a .py, .sql or .md file in one of these folders is written, created, moved or deleted, or a folder is created in one of them.
+
+Saving a file often comes as a burst of events (editors write to a temporary file and rename it, formatters run after saving, ...).
+So after the first event, mindoc waits until things have been quiet for a moment before rebuilding.
+
+A folder that is deleted or moved away, e.g. by git checkout or git stash, is watched again as soon as it is back.
+When the operating system had to drop events because there were too many, all the files are checked again.
+
+If inotify is not available, the watch mode falls back to checking the files at every interval.
+"""
+class InotifyWatcher:
+    
+    # Written, created, moved and deleted files (IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE)
+    EVENT_MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    
+    # Created or moved in folders (IN_CREATE or IN_MOVED_TO, with IN_ISDIR)
+    NEW_DIR_MASK = 0x80 | 0x100
+    IN_MOVED_FROM = 0x40
+    IN_ISDIR = 0x40000000
+    
+    # The watch of a folder was removed, e.g. because the folder was deleted, and events were lost (with no watch)
+    IN_IGNORED = 0x8000
+    IN_Q_OVERFLOW = 0x4000
+    
+    # Seconds of quiet after an event before the files are checked
+    DEBOUNCE = 0.1
+    
+    def __init__(self, libc, inotify_fd: int):
+        self.libc = libc
+        self.inotify_fd = inotify_fd
+        self.watched_dirs = set()
+        self.watch_paths = {}
+    
+    @classmethod
+    def create(cls):
+        if not sys.platform.startswith('linux'):
+            return None
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if inotify_fd < 0:
+            return None
+        return cls(libc, inotify_fd)
+    
+    def add_dirs(self, dirs: set):
+        for dir_path in dirs - self.watched_dirs:
+            watch = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(dir_path), self.EVENT_MASK)
+            if watch >= 0:
+                # A folder that was moved keeps its watch, which is then found again under the new path
+                self.watched_dirs.add(dir_path)
+                self.watch_paths[watch] = dir_path
+    
+    def forget_dirs(self, dir_path: str):
+        # The folder and the folders in it are watched again if they are found again, e.g. when a folder is deleted and created again
+        self.watched_dirs = set(path for path in self.watched_dirs if path != dir_path and not path.startswith(dir_path + os.sep))
+    
+    def wait(self):
+        # Sleep until a code file changes, then until things are quiet again
+        while not self.read_events(None):
+            pass
+        while self.read_events(self.DEBOUNCE):
+            pass
+    
+    def read_events(self, timeout) -> bool:
+        import select
+        import struct
+        readable = select.select([self.inotify_fd], [], [], timeout)[0]
+        if not readable:
+            return False
         
-        html_file_path = dir_path + doc + file_name.replace('.py', '.html').replace('.sql', '.html').replace('.md', '.html')
+        try:
+            events = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return False
         
-        save_as(html, html_file_path)
+        # Each event is a struct inotify_event: int wd, uint32 mask, uint32 cookie, uint32 len, char name[len]
+        code_file_changed = False
+        offset = 0
+        while offset + 16 <= len(events):
+            (watch, mask, cookie, name_length) = struct.unpack_from('iIII', events, offset)
+            name = events[offset + 16:offset + 16 + name_length].rstrip(b'\0')
+            if watch == -1 and mask & self.IN_Q_OVERFLOW:
+                # Too many events to keep, so look at all the files again
+                code_file_changed = True
+            elif mask & self.IN_IGNORED:
+                if watch in self.watch_paths:
+                    self.forget_dirs(self.watch_paths.pop(watch))
+                code_file_changed = True
+            elif mask & self.IN_ISDIR and mask & self.IN_MOVED_FROM:
+                if watch in self.watch_paths:
+                    self.forget_dirs(os.path.normpath(os.path.join(self.watch_paths[watch], os.fsdecode(name))))
+                code_file_changed = True
+            elif name.endswith((b'.py', b'.sql', b'.md')):
+                code_file_changed = True
+            elif mask & self.IN_ISDIR and mask & self.NEW_DIR_MASK:
+                # Look for code files in the new folder, and watch it too
+                code_file_changed = True
+            offset += 16 + name_length
+        return code_file_changed
+
+
+"""
+### Serving the docs while writing them
+
+Instead of opening the .html files from the disk and refreshing the browser after every change, the docs can be served by a small local web server.
+
+> mindoc serve ./src/*.py
+
+Then open http://localhost:8000/docs/ (or whichever page) in the browser. Use the port option (-p) for another port.
+
+* The docs are converted in memory when they are asked for, and are not written to the disk.
+* When a code file changes, its doc is converted again and every page of it that is open in the browser reloads by itself.
+* Anything else, e.g. images, is served from the current folder as it is.
+
+A doc is only converted again when its code file changed since it was last converted.
+"""
+LIVE_RELOAD_PATH = '/__mindoc__/events'
+
+LIVE_RELOAD_SCRIPT = (
+    'new EventSource("' + LIVE_RELOAD_PATH + '").onmessage = function (event) {'
+    ' if (event.data === location.pathname) { location.reload(); } };'
+)
+
+
+class DocServer:
+    
+    # Mixed into http.server.ThreadingHTTPServer by serve_docs, like the request handler
+    
+    daemon_threads = True
+    
+    def __init__(self, address: tuple, src_paths: list, options: dict, filters: dict = None):
+        import http.server
+        super().__init__(address, mix_in(DocRequestHandler, http.server.SimpleHTTPRequestHandler))
+        self.src_paths = src_paths
+        self.filters = filters
+        self.options = options
+        self.docs = {}
+        self.rendered_docs = {}
+        self.render_lock = threading.Lock()
+        self.changes = threading.Condition()
+        self.changed_urls = []
+        self.indexed_files = {}
+        self.symbols = None
+        self.find_docs()
+        if options.get('xref', False):
+            (self.indexed_files, self.symbols, changed_symbols) = index_symbols(list(self.docs.values()), load_symbol_index(CACHE_DIR))
+    
+    def find_docs(self):
+        # The url of every doc, e.g. /docs/awesome.html, and the code file it comes from
+        # The request threads may be looking docs up, so the new urls are put in place all at once
+        docs = {}
+        for code_file_path in find_code_files(self.src_paths, self.filters):
+            url = '/' + os.path.normpath(get_html_file_path(code_file_path)).replace(os.sep, '/')
+            docs[url] = code_file_path
+        self.docs = docs
+    
+    def render(self, code_file_path: str) -> str:
+        with self.render_lock:
+            # The code file is only read and hashed again when its modification time or size changed
+            rendered = self.rendered_docs.get(code_file_path)
+            source_state = get_source_state(code_file_path, None if rendered is None else rendered[0])
+            if rendered is None or rendered[0][2] != source_state[2]:
+                html = convert_code(get_code(code_file_path), code_file_path, self.options, symbols=self.symbols)
+                # The last </body> is the page's own, an earlier one can be in the text of the doc
+                body_end = html.rfind(endtag('body'))
+                html = html[:body_end] + tag('script') + LIVE_RELOAD_SCRIPT + endtag('script') + html[body_end:]
+                rendered = (source_state, html)
+                self.rendered_docs[code_file_path] = rendered
+            return rendered[1]
+    
+    def watch(self, interval: float, poll: bool):
+        for changed_files in watch_changes(self.src_paths, interval, poll, self.filters):
+            self.find_docs()
+            if self.symbols is not None:
+                with self.render_lock:
+                    (self.indexed_files, self.symbols, changed_files) = update_symbols(list(self.docs.values()), self.indexed_files, changed_files)
+                    for code_file_path in changed_files:
+                        self.rendered_docs.pop(code_file_path, None)
+            changed_urls = [url for (url, code_file_path) in self.docs.items() if code_file_path in changed_files]
+            for code_file_path in changed_files:
+                start_time = time.perf_counter()
+                self.render(code_file_path)
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+                print(f'Doc for {code_file_path} reconverted in {elapsed_ms:.0f} ms.')
+            with self.changes:
+                self.changed_urls += changed_urls
+                self.changes.notify_all()
+
+
+class DocRequestHandler:
+    
+    def do_GET(self):
+        import urllib.parse
+        url = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if url == LIVE_RELOAD_PATH:
+            self.send_changes()
+        elif url in self.server.docs:
+            self.send_content(self.server.render(self.server.docs[url]), 'text/html')
+        elif url.endswith(get_asset_file_names()):
+            (css, js) = get_page_assets()
+            self.send_content(css if url.endswith('.css') else js, 'text/css' if url.endswith('.css') else 'text/javascript')
+        elif '/' + VENDOR_DIR + '/' in url and 'offline' in self.server.options:
+            self.send_vendor_file(url.split('/' + VENDOR_DIR + '/', 1)[1])
+        else:
+            super().do_GET()
+    
+    def send_content(self, content, content_type: str):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+            content_type += '; charset=utf-8'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(content)
+    
+    def send_vendor_file(self, file_name: str):
+        # The vendor folder does not have to be in the folder being served, so its files are sent from where it is
+        vendor_dir = os.path.abspath(self.server.options['offline'])
+        file_path = os.path.abspath(os.path.join(vendor_dir, file_name))
+        if os.path.commonpath([vendor_dir, file_path]) != vendor_dir or not os.path.isfile(file_path):
+            self.send_error(404)
+            return
+        with open(file_path, 'rb') as vendor_file:
+            self.send_content(vendor_file.read(), self.guess_type(file_path))
+    
+    def send_changes(self):
+        # Server-sent events: tell the page the url of every doc that changed, until the page goes away
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
         
-        if print_production:
-            print(f'Doc for {code_file_path} saved as {html_file_path}.')
+        changes = self.server.changes
+        with changes:
+            seen = len(self.server.changed_urls)
+        try:
+            while True:
+                with changes:
+                    changes.wait_for(lambda: len(self.server.changed_urls) > seen, timeout=15)
+                    changed_urls = self.server.changed_urls[seen:]
+                    seen = len(self.server.changed_urls)
+                # An empty comment every now and then finds out when the page has gone away
+                message = ''.join(f'data: {url}\n\n' for url in changed_urls) or ':\n\n'
+                self.wfile.write(message.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_docs(src_paths: list, port: int, interval: float, options: dict = None, poll: bool = False, filters: dict = None):
+    import http.server
+    server = mix_in(DocServer, http.server.ThreadingHTTPServer)(('127.0.0.1', port), src_paths, options or {}, filters)
+    print(f'Serving the docs on http://localhost:{server.server_address[1]}/')
+    for url in server.docs:
+        print(f'  http://localhost:{server.server_address[1]}{url}')
+    print('Ctrl+c to exit')
+    
+    threading.Thread(target=server.watch, args=(interval, poll), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+"""
+### Keeping mindoc running
+
+Starting python and importing mindoc and its packages takes longer than converting a file or two.
+When mindoc is run for a few files at a time, e.g. from a pre-commit hook, a daemon can be left running instead, so that each run only has to convert the files:
+
+> mindoc daemon &
+
+> mindoc client ./src/changed.py
+
+* The client takes the same options as mindoc itself. It sends the paths and the options to the daemon, which converts the files as if mindoc was run in the folder of the client.
+* They talk over a Unix socket, mindoc-(user id).sock in the runtime folder of the user ($XDG_RUNTIME_DIR) or else in the temporary folder; use the socket option (--socket) of both to change that.
+* The daemon writes files as the user that started it, so only that user can connect to the socket, and the client only talks to a daemon of the same user.
+* If no daemon is running, or it runs another version of mindoc, the client converts the files itself.
+* mindoc client --stop stops the daemon.
+
+The daemon converts the requests one at a time, in the order they come in.
+"""
+def get_socket_path() -> str:
+    import tempfile
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir or not os.path.isdir(runtime_dir):
+        runtime_dir = tempfile.gettempdir()
+    return os.path.join(runtime_dir, f'mindoc-{os.getuid()}.sock')
+
+
+class DaemonRequestHandler:
+    
+    # Mixed into socketserver.StreamRequestHandler by run_daemon
+    
+    def handle(self):
+        # One request per connection, as a line of json, and one line of json back
+        request = json.loads(self.rfile.readline())
+        if request.get('version') != __version__:
+            response = {'error': f'the daemon runs mindoc {__version__}', 'version': __version__}
+        elif request.get('ping', False):
+            response = {'pong': True}
+        elif request.get('stop', False):
+            response = {'stopped': True}
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            try:
+                response = make_requested_docs(request)
+            except Exception as error:
+                response = {'error': f'{type(error).__name__}: {error}'}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+def make_requested_docs(request: dict) -> dict:
+    previous_dir = os.getcwd()
+    os.chdir(request['cwd'])
+    try:
+        # The folders may have changed since the last request
+        saved_asset_dirs.clear()
+        saved_vendor_dirs.clear()
+        code_files = find_code_files(request['paths'], request['filters'])
+        docs = make_docs(code_files, print_production=False, jobs=request['jobs'], cache_dir=request['cache_dir'], options=request['options'])
+    finally:
+        os.chdir(previous_dir)
+    return {'docs': docs, 'files': len(code_files)}
+
+
+def run_daemon(socket_path: str):
+    if os.path.exists(socket_path):
+        if ask_daemon(socket_path, {'version': __version__, 'ping': True}) is not None:
+            print(f'A daemon is already listening on {socket_path}')
+            return
+        # Left behind by a daemon that did not stop cleanly
+        try:
+            os.remove(socket_path)
+        except OSError as error:
+            print(f'Cannot remove {socket_path}: {error.strerror}; use the socket option (--socket) for another path')
+            return
+    
+    import socketserver
+    # Only readable and writable by the user, from the moment the socket is created
+    umask = os.umask(0o177)
+    try:
+        daemon = socketserver.UnixStreamServer(socket_path, mix_in(DaemonRequestHandler, socketserver.StreamRequestHandler))
+    finally:
+        os.umask(umask)
+    print(f'Listening on {socket_path}')
+    print('Ctrl+c to exit')
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
+        os.remove(socket_path)
+
+
+def ask_daemon(socket_path: str, request: dict) -> dict:
+    import socket
+    try:
+        if os.stat(socket_path).st_uid != os.getuid():
+            # Not a daemon of this user
+            return None
+    except OSError:
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+    
+    connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+    response = connection.makefile('rb').readline()
+    connection.close()
+    return json.loads(response) if response else None
+
+
+def ask_daemon_for_docs(socket_path: str, src_paths: list, filters: dict, jobs: int, cache_dir: str, options: dict) -> list:
+    request = {'version': __version__, 'cwd': os.getcwd(), 'paths': src_paths, 'filters': filters,
+               'jobs': jobs, 'cache_dir': cache_dir, 'options': options}
+    response = ask_daemon(socket_path, request)
+    if response is None or 'version' in response:
+        # No daemon, or another version of mindoc, so convert the files here
+        return None
+    if 'error' in response:
+        print(f"mindoc daemon: {response['error']}")
+        sys.exit(1)
+    
+    for doc in response['docs']:
+        print(f"Doc for {doc['code_file']} saved as {doc['html_file']}.")
+    if cache_dir is not None and len(response['docs']) < response['files']:
+        print(f"{response['files'] - len(response['docs'])} docs already up to date.")
+    return response['docs']
 
 
 def main():
-    parser = argparse.ArgumentParser()
+    import argparse
+    argv = sys.argv[1:]
+    command = argv[0] if argv[:1] in (['serve'], ['daemon'], ['client']) else None
+    if command is not None:
+        argv = argv[1:]
+    
+    if command == 'daemon':
+        parser = argparse.ArgumentParser(prog='mindoc daemon')
+        parser.add_argument('--socket', metavar='PATH', help='Unix socket to listen on (default: mindoc-<user id>.sock in $XDG_RUNTIME_DIR or the temporary folder)')
+        args = parser.parse_args(argv)
+        run_daemon(args.socket or get_socket_path())
+        return
+    
+    parser = argparse.ArgumentParser(prog=f'mindoc {command}' if command else None)
+    if command == 'serve':
+        parser.add_argument('-p', '--port', type=int, default=8000, help='Port of the local web server (default: 8000)')
+    if command == 'client':
+        parser.add_argument('--socket', metavar='PATH', help='Unix socket of the daemon (default: mindoc-<user id>.sock in $XDG_RUNTIME_DIR or the temporary folder)')
+        parser.add_argument('--stop', action='store_true', help='Stop the daemon')
     parser.add_argument('-w', '--watch', action='store_true', help='Watch original files and re-generate documentation on changes')
-    parser.add_argument("src_path", metavar="path", type=str, help="Path to code files to be converted to .html doc; accepts * as wildcard")
-
-    args = parser.parse_args()
+    parser.add_argument('--poll', action='store_true', help='Check the files at every interval in watch mode instead of using inotify')
+    parser.add_argument('-i', '--interval', type=float, default=0.5, help='Seconds between checks for changes in watch mode (default: 0.5)')
+    parser.add_argument('--external-assets', action='store_true', help='Link to shared mindoc.css and mindoc.js files instead of inlining them in every page')
+    parser.add_argument('--xref', action='store_true', help='Link references to the headers of all the converted files, not only of the same file')
+    parser.add_argument('--index', metavar='DIR', help='Save an index.html page listing all the docs, with a search index, in DIR')
+    parser.add_argument('--prerender', action='store_true', help='Highlight the code and draw the diagrams while building instead of in the browser')
+    parser.add_argument('--offline', metavar='VENDOR_DIR', help='Copy the scripts from a folder of local copies instead of loading them from the internet')
+    parser.add_argument('--lazy-code', action='store_true', help='Save the code blocks of every page in a separate script, only loaded when a code block is opened')
+    parser.add_argument('--split-size', type=int, metavar='KB', help='Split pages bigger than this many kilobytes into several pages at their h1 and h2 headers')
+    parser.add_argument('--minify', action='store_true', help='Collapse the spaces and new lines in the pages, except in code blocks and scripts')
+    parser.add_argument('--compress', action='store_true', help='Also save a .gz copy of every page, and a .br copy if the brotli package is installed, for web servers to send as they are')
+    parser.add_argument('--block-cache', action='store_true', help='Also keep the html of every code block and the documentation before it in the cache folder, to convert only the edited blocks of big files')
+    parser.add_argument('--no-cache', action='store_true', help='Rebuild every file instead of skipping the unchanged ones')
+    parser.add_argument('--stats', action='store_true', help='Print the slowest files and the time spent in each stage')
+    parser.add_argument('--stats-file', metavar='FILE', help='Save the time spent on each file and stage as a .json or .csv file')
+    parser.add_argument('--profile', metavar='FILE', help='Run the build under cProfile and save the profile as FILE (.prof)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes used to convert the files; 0 uses all cores (default: 1)')
+    parser.add_argument('--include', metavar='PATTERN', action='append', default=[], help='Only convert the files that match the pattern (like in .gitignore); can be given more than once')
+    parser.add_argument('--exclude', metavar='PATTERN', action='append', default=[], help='Leave out the files and folders that match the pattern (like in .gitignore); can be given more than once')
+    parser.add_argument('--no-gitignore', action='store_true', help='Also convert the files that are ignored by .gitignore files')
+    parser.add_argument("src_paths", metavar="path", type=str, nargs='*' if command == 'client' else '+', help="Code files or folders to be converted to .html docs; accepts * and ** as wildcards")
+
+    args = parser.parse_args(argv)
+    
+    if command == 'client' and args.stop:
+        if ask_daemon(args.socket or get_socket_path(), {'version': __version__, 'stop': True}) is None:
+            print('No daemon is running')
+        return
+    if not args.src_paths:
+        parser.error('the following arguments are required: path')
     
     print('')
-    files = glob.glob(args.src_path)
-    code_files = [x for x in files if x.endswith('.py')]
-    code_files += [x for x in files if x.endswith('.sql')]
-    code_files += [x for x in files if x.endswith('.md')]
     
-    make_docs(code_files, print_production=True)
+    options = {}
+    if args.external_assets:
+        options['external_assets'] = True
+    if args.xref:
+        options['xref'] = True
+    if args.index is not None:
+        options['index'] = args.index
+    if args.prerender:
+        options['prerender'] = True
+    if args.block_cache:
+        options['block_cache'] = True
+    if args.minify:
+        options['minify'] = True
+    if args.compress:
+        options['compress'] = True
+    if args.lazy_code:
+        options['lazy_code'] = True
+    if args.split_size is not None:
+        if args.split_size <= 0:
+            parser.error('the split size must be a positive number of kilobytes')
+        options['split_size'] = args.split_size * 1024
+    if args.offline is not None:
+        if not os.path.isdir(args.offline):
+            parser.error(f'{args.offline} is not a folder')
+        options['offline'] = args.offline
+    
+    filters = {'include': args.include, 'exclude': args.exclude, 'gitignore': not args.no_gitignore}
+    
+    if command == 'serve':
+        serve_docs(args.src_paths, args.port, args.interval, options, poll=args.poll, filters=filters)
+        return
+    
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    
+    cache_dir = None if args.no_cache else CACHE_DIR
+    docs = None
+    if command == 'client':
+        docs = ask_daemon_for_docs(args.socket or get_socket_path(), args.src_paths, filters, args.jobs, cache_dir, options)
+    if docs is None:
+        code_files = find_code_files(args.src_paths, filters)
+        docs = make_docs(code_files, print_production=True, jobs=args.jobs, cache_dir=cache_dir, options=options)
+    
+    if args.profile:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f'Profile saved as {args.profile}.')
+    if args.stats:
+        print('')
+        print_stats(docs)
+    if args.stats_file:
+        save_stats(docs, args.stats_file)
+        print(f'Stats saved as {args.stats_file}.')
     
     if args.watch:
         print('Watching...')
         print('Ctrl+c to exit')
-        while True:
-            make_docs(code_files, print_production=False)
-            time.sleep(3)
+        watch_docs(args.src_paths, args.interval, options, poll=args.poll, filters=filters)
     
     print('')
     
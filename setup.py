@@ -25,11 +25,10 @@ setup(
         "Operating System :: OS Independent",
     ],
     entry_points={"console_scripts": ["mindoc = mindoc:main"]},
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     install_requires=[
         "appdirs==1.4.4",
         "attrs==19.3.0",
-        "beautifulsoup4==4.9.1",
         "black==19.10b0; python_version >= '3.6'",
         "cached-property==1.5.1",
         "cerberus==1.3.2",
@@ -54,7 +53,6 @@ setup(
         "requests==2.23.0",
         "requirementslib==1.5.9",
         "six==1.15.0",
-        "soupsieve==2.0.1",
         "toml==0.10.1",
         "tomlkit==0.6.0",
         "typed-ast==1.4.1",
@@ -0,0 +1,47 @@
+import hashlib
+import os
+import re
+
+import mindoc
+
+CODE = '"""\n# A\n"""\nx = 1\n'
+
+
+def write(file_path, content):
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def read(file_path):
+    with open(file_path, encoding='utf-8') as file:
+        return file.read()
+
+
+def test_asset_file_names_have_the_content_hash():
+    (css, js) = mindoc.get_page_assets()
+    (css_file_name, js_file_name) = mindoc.get_asset_file_names()
+    assert css_file_name == 'mindoc.' + hashlib.sha1(css.encode('utf-8')).hexdigest()[:8] + '.css'
+    assert js_file_name == 'mindoc.' + hashlib.sha1(js.encode('utf-8')).hexdigest()[:8] + '.js'
+    assert re.fullmatch(r'mindoc\.[0-9a-f]{8}\.css', css_file_name)
+
+
+def test_assets_are_saved_once_in_each_docs_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mindoc, 'saved_asset_dirs', set())
+    write(os.path.join('src', 'a.py'), CODE)
+    write(os.path.join('src', 'b.py'), CODE)
+    write(os.path.join('lib', 'c.py'), CODE)
+    
+    mindoc.make_docs([os.path.join('src', 'a.py'), os.path.join('src', 'b.py'), os.path.join('lib', 'c.py')],
+                     print_production=False, options={'external_assets': True})
+    
+    (css, js) = mindoc.get_page_assets()
+    (css_file_name, js_file_name) = mindoc.get_asset_file_names()
+    for docs_dir in ['docs', os.path.join('lib', 'docs')]:
+        assert read(os.path.join(docs_dir, css_file_name)) == css
+        assert read(os.path.join(docs_dir, js_file_name)) == js
+    html = read(os.path.join('docs', 'a.html'))
+    assert f'<link rel="stylesheet" href="{css_file_name}">' in html
+    assert f'<script src="{js_file_name}"></script>' in html
+    assert css not in html
@@ -0,0 +1,76 @@
+"""
+Splitting the .py and .sql files into blocks in a single pass has to give exactly the same markdown
+as the string replacements it replaced, which are kept here as the reference.
+
+The one known difference is a line of triple double quotes right after another one, i.e. an empty code block.
+The replacements found the second line again in the text they had put in for the first, so they closed
+the code block straight away and were out of step with the blocks from then on; such files are left out.
+"""
+import itertools
+import random
+import re
+
+import pytest
+
+import mindoc
+
+PIECES = ['"""\n', '\n"""\n', '"""', "'''\n", '\n', '\r\n', ' ', 'x = 1', '# header', '/*', '*/', '/* doc */', '*', '/']
+
+
+def replace_every_nth(original_string: str, substring_to_replace: str, replace_with: str, nth: int) -> str:
+    counter = itertools.count()
+    return re.sub(f'({substring_to_replace})', lambda match: match.group() if next(counter) % nth else replace_with, original_string)
+
+
+def reference_python_blocks(code: str) -> str:
+    code = code.replace('\r\n', '\n')
+    pre_html = code.replace('"""\n', '', 1)
+
+    br = mindoc.tag('br')
+    collapsible_button = mindoc.tag('button type="button" class="collapsible" style="width: 80px; text-align:center; margin-bottom:0px;"')
+    content_div = mindoc.tag('div style=" margin: 0;" class="content"')
+    replace_with_pre = '\n' + br + br + collapsible_button + 'View code' + mindoc.endtag('button') + content_div + '\n```python\n\n'
+    replace_with_post = '\n```\n\n' + mindoc.endtag('div') + '\n'
+
+    pre_html = replace_every_nth(pre_html, '\n"""\n', replace_with_pre, nth=2)
+    pre_html = pre_html.replace('\n"""\n', replace_with_post)
+    return pre_html + replace_with_post
+
+
+def reference_sql_blocks(code: str) -> str:
+    code = code.replace('\r\n', '\n')
+    pre_html = code.replace('/*', '', 1)
+
+    br = mindoc.tag('br')
+    collapsible_button = mindoc.tag('button type="button" class="collapsible" style="width: 80px; text-align:center; margin-bottom:0px;"')
+    content_div = mindoc.tag('div style=" margin: 0;" class="content"')
+    replace_with_pre = br + collapsible_button + 'View code' + mindoc.endtag('button') + content_div + '\n```sql'
+    replace_with_post = '```\n' + mindoc.endtag('div') + '\n'
+
+    pre_html = pre_html.replace('*/', replace_with_pre, 1)
+    return pre_html + replace_with_post
+
+
+def make_code(rng: random.Random) -> str:
+    return ''.join(rng.choice(PIECES) for _ in range(rng.randrange(60)))
+
+
+def has_empty_code_block(code: str) -> bool:
+    return '\n"""\n"""\n' in code.replace('\r\n', '\n').replace('"""\n', '', 1)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_python_blocks_are_split_like_before(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        code = make_code(rng)
+        if not has_empty_code_block(code):
+            assert mindoc.convert_python_blocks(code) == reference_python_blocks(code)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sql_blocks_are_split_like_before(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        code = make_code(rng)
+        assert mindoc.convert_sql_blocks(code) == reference_sql_blocks(code)
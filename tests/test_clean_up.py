@@ -0,0 +1,61 @@
+"""
+The fused clean up passes have to give exactly the same page as the replacements they replaced,
+which are kept here as the reference, and the scripts a page needs have to be found the same way.
+"""
+import random
+import re
+
+import pytest
+
+import mindoc
+from test_render_units import CODE_PIECES, DOC_PIECES, FLAGS
+
+EXTRA_PIECES = [
+    'Escaped &amp;lt; and &lt;b&gt; and &amp;amp;',
+    'A <b>tag</b> & an ampersand',
+    'code class="lang-mermaid" and prettyprint lang-mermaid in text',
+    '<p>a paragraph tag</p>',
+    '<pre>pre in text</pre>',
+    '$$\\int x dx$$',
+    '    <pre>indented</pre>',
+]
+
+
+def reference_clean_up(body: str) -> str:
+    br = mindoc.tag('br')
+    pre = mindoc.tag('pre')
+    body = body.replace(mindoc.tag('p'), '')
+    body = body.replace(mindoc.endtag('p'), br)
+    body = re.sub(br + r'[\w\W+]' + pre, pre, body)
+    body = body.replace('code class="', 'code class="prettyprint ')
+    body = body.replace('prettyprint lang-mermaid', 'mermaid')
+    return body
+
+
+def uses_scripts(body: str) -> tuple:
+    # Math is looked for in the cleaned page only, as it depends on where the code is
+    return ('class="prettyprint lang-' in body, 'class="mermaid"' in body)
+
+
+def make_code(rng: random.Random) -> str:
+    blocks = []
+    for _ in range(rng.randrange(1, 6)):
+        doc_pieces = [rng.choice(DOC_PIECES + EXTRA_PIECES * 3).format(n=rng.randrange(10)) for _ in range(rng.randrange(1, 5))]
+        code_pieces = [rng.choice(CODE_PIECES + EXTRA_PIECES).format(n=rng.randrange(10)) for _ in range(rng.randrange(1, 4))]
+        blocks += ['\n\n'.join(doc_pieces), '\n'.join(code_pieces)]
+    return '"""\n' + '\n"""\n'.join(blocks) + '\n'
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_clean_up_gives_the_same_page(seed):
+    rng = random.Random(seed)
+    markdown = mindoc.get_markdown()
+    for _ in range(10):
+        markdown.renderer.reset(*rng.choice(FLAGS))
+        body = markdown(mindoc.convert_python_blocks(make_code(rng)))
+
+        expected = reference_clean_up(body)
+        cleaned = mindoc.clean_up(body)
+        assert cleaned == mindoc.unescape(expected)
+        # The scripts were looked for before the html was unescaped
+        assert uses_scripts(cleaned) == uses_scripts(expected)
@@ -0,0 +1,65 @@
+import gzip
+import os
+
+import mindoc
+
+
+def write(file_path, content):
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def read_gzip(file_path):
+    with gzip.open(file_path, 'rt', encoding='utf-8') as file:
+        return file.read()
+
+
+def test_compressed_copy_follows_page_built_without_compress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    page = os.path.join('docs', 'a.html')
+    
+    write('a.py', '"""\n# First\n"""\nprint(1)\n')
+    mindoc.make_docs(['a.py'], print_production=False, cache_dir='cache', options={'compress': True})
+    write('a.py', '"""\n# Second\n"""\nprint(2)\n')
+    mindoc.make_docs(['a.py'], print_production=False, cache_dir='cache', options={})
+    mindoc.make_docs(['a.py'], print_production=False, cache_dir='cache', options={'compress': True})
+    
+    with open(page, encoding='utf-8') as file:
+        html = file.read()
+    assert 'Second' in html
+    assert read_gzip(page + '.gz') == html
+
+
+def test_unchanged_page_is_not_compressed_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    page = os.path.join('docs', 'a.html')
+    write('a.py', '"""\n# First\n"""\nprint(1)\n')
+    mindoc.make_docs(['a.py'], print_production=False, options={'compress': True})
+    os.utime(page + '.gz', (0, 0))
+    
+    mindoc.make_docs(['a.py'], print_production=False, options={'compress': True})
+    
+    assert os.stat(page + '.gz').st_mtime == 0
+
+
+def test_minify_leaves_pre_script_and_textarea_alone():
+    kept = ['<pre><code>x  =  1\n\n\n    y = 2</code></pre>', '<script>var  a =\n\n  1;</script>',
+            '<TEXTAREA rows="2">a    b\n\n</TEXTAREA>', '<pre class="mermaid">A  -->  B</pre>']
+    html = '<p>Some    text</p>\n\n\n' + '  \n  '.join(kept) + '<div>  a  </div>'
+    minified = mindoc.minify_html(html)
+    for part in kept:
+        assert part in minified
+    assert '<p>Some text</p>\n' in minified
+    assert '<div> a </div>' in minified
+
+
+def test_minified_page_keeps_the_code(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code = '"""\n# Title\n\nSome    text.\n"""\ndef f():\n\n\n    return  [1,    2]\n'
+    write('a.py', code)
+    mindoc.make_docs(['a.py'], print_production=False, options={'minify': True})
+    
+    with open(os.path.join('docs', 'a.html'), encoding='utf-8') as file:
+        html = file.read()
+    assert 'def f():\n\n\n    return  [1,    2]' in html
+    assert len(html) < len(mindoc.convert_code(code, 'a.py', {}))
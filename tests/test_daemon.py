@@ -0,0 +1,33 @@
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+import mindoc
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'getuid') or sys.platform == 'win32', reason='Unix sockets only')
+
+
+def test_socket_is_in_runtime_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    assert os.path.dirname(mindoc.get_socket_path()) == str(tmp_path)
+
+
+def test_socket_is_only_for_the_user(tmp_path):
+    socket_path = str(tmp_path / 'mindoc.sock')
+    daemon = threading.Thread(target=mindoc.run_daemon, args=(socket_path,))
+    daemon.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.05)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        assert mindoc.ask_daemon(socket_path, {'version': mindoc.__version__, 'ping': True}) == {'pong': True}
+    finally:
+        mindoc.ask_daemon(socket_path, {'version': mindoc.__version__, 'stop': True})
+        daemon.join(5)
+    assert not os.path.exists(socket_path)
@@ -0,0 +1,51 @@
+"""
+The highlighting done with --prerender has to give each string, comment and number its own span,
+whatever punctuation comes right before it.
+"""
+import re
+
+import pytest
+
+import mindoc
+
+
+def spans(code: str, lang: str) -> list:
+    html = mindoc.highlight_code(code, lang)
+    return [(kind, mindoc.unescape(text)) for kind, text in re.findall(r'<span class="(\w+)">([\s\S]*?)</span>', html)]
+
+
+@pytest.mark.parametrize('code, string', [
+    ('print("hello")', '"hello"'),
+    ("x = ['a', 'b']", "'a'"),
+    ('x="hello"', '"hello"'),
+    ("f(b'bytes')", "b'bytes'"),
+    ('d[f"{x}"]', 'f"{x}"'),
+    ('x = ("""\nlong\n""")', '"""\nlong\n"""'),
+])
+def test_python_strings_after_punctuation(code, string):
+    assert ('str', string) in spans(code, 'python')
+
+
+def test_python_comment_after_punctuation():
+    assert ('com', '# the end') in spans('f(x)# the end', 'python')
+
+
+@pytest.mark.parametrize('number', ['0x1F', '0o17', '0b1010', '0xdead_beef', '1_000', '3.14', '1e-5', '2j'])
+def test_python_numbers(number):
+    assert spans(f'x = ({number})', 'python') == [('pln', 'x'), ('pun', '='), ('pun', '('), ('lit', number), ('pun', ')')]
+
+
+def test_unclosed_quote_is_punctuation():
+    assert ('pun', "'") in spans("x = 'not closed", 'python')
+
+
+@pytest.mark.parametrize('code, kind, text', [
+    ("WHERE a=('x')", 'str', "'x'"),
+    ("IN ('a','b')", 'str', "'b'"),
+    ('SELECT a,-- a comment', 'com', '-- a comment'),
+    ('SELECT (/* a comment */ 1)', 'com', '/* a comment */'),
+    ('SELECT a-1', 'pun', '-'),
+    ('SELECT a/2', 'pun', '/'),
+])
+def test_sql_tokens_after_punctuation(code, kind, text):
+    assert (kind, text) in spans(code, 'sql')
@@ -0,0 +1,37 @@
+import os
+
+import mindoc
+
+
+def write_sources(src_dir):
+    os.makedirs(src_dir)
+    code_files = []
+    for number in range(12):
+        code_file_path = os.path.join(src_dir, f'file{number}.py')
+        with open(code_file_path, 'w') as file:
+            file.write(f'"""\n# File {number}\n\n[TOC]\n\n## Part {number}\n\nSee [Part {number}] and $x^{number}$.\n"""\nx = {number}\n')
+        code_files.append(code_file_path)
+    return code_files
+
+
+def read_docs(docs_dir):
+    docs = {}
+    for file_name in sorted(os.listdir(docs_dir)):
+        with open(os.path.join(docs_dir, file_name), 'rb') as file:
+            docs[file_name] = file.read()
+    return docs
+
+
+def test_jobs_give_the_same_docs_as_one_job(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code_files = write_sources('src')
+    
+    one_job = mindoc.make_docs(code_files, print_production=False, jobs=1)
+    expected = read_docs('docs')
+    for file_name in os.listdir('docs'):
+        os.remove(os.path.join('docs', file_name))
+    
+    several_jobs = mindoc.make_docs(code_files, print_production=False, jobs=3)
+    assert read_docs('docs') == expected
+    assert [doc['html_file'] for doc in several_jobs] == [doc['html_file'] for doc in one_job]
+    assert len(expected) == len(code_files)
@@ -0,0 +1,22 @@
+import pytest
+
+import mindoc
+
+
+def convert(code: str) -> str:
+    return mindoc.convert_code(code, 'a.py', {})
+
+
+@pytest.mark.parametrize('doc', ['Inline $x^2$ math', '$$\\int x dx$$', 'Inline \\\\(x\\\\) math', '\\\\[x\\\\]'])
+def test_math_loads_mathjax(doc):
+    assert 'MathJax.js' in convert(f'"""\n{doc}\n"""\nx = 1\n')
+
+
+@pytest.mark.parametrize('doc, code', [
+    ('It costs $5.', 'x = 1'),
+    ('Some text', 'price = "$5" + "$10"'),
+    ('Some text', 'pattern = r"\\(x\\)"'),
+    ('Some `$x$` code', 'x = 1'),
+])
+def test_dollars_in_code_or_alone_do_not_load_mathjax(doc, code):
+    assert 'MathJax.js' not in convert(f'"""\n{doc}\n"""\n{code}\n')
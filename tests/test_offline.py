@@ -0,0 +1,31 @@
+import os
+import re
+
+import mindoc
+
+CODE = '"""\n# A\n\n```mermaid\ngraph LR\n    A-->B\n```\n"""\nx = 1\n'
+
+
+def write(file_path, content):
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def test_vendor_files_are_copied_once_for_all_docs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write(os.path.join('vendor', 'mermaid', 'mermaid.min.js'), '// mermaid')
+    write(os.path.join('src', 'a.py'), CODE)
+    write(os.path.join('src', 'sub', 'b.py'), CODE)
+    write('README.md', CODE)
+    code_files = [os.path.join('src', 'a.py'), os.path.join('src', 'sub', 'b.py'), 'README.md']
+    
+    mindoc.make_docs(code_files, print_production=False, options={'offline': 'vendor'})
+    
+    copies = [dir_path for (dir_path, dir_names, file_names) in os.walk('.') if os.path.basename(dir_path) == mindoc.VENDOR_DIR]
+    assert copies == [os.path.join('.', mindoc.VENDOR_DIR)]
+    for code_file_path in code_files:
+        html_file_path = mindoc.get_html_file_path(code_file_path)
+        with open(html_file_path) as file:
+            src = re.search(r'src="([^"]*mermaid\.min\.js)"', file.read()).group(1)
+        assert os.path.exists(os.path.join(os.path.dirname(html_file_path), src))
@@ -0,0 +1,43 @@
+import json
+import os
+import re
+
+import mindoc
+
+
+def write_big_file(file_path):
+    sections = ['"""\n# Big\n\n[TOC]\n"""\nx = 0\n']
+    for number in range(1, 6):
+        sections.append(f'"""\n## Part {number}\n\nSee [Part 5].\n"""\n' + f'x = {number}\n' * 200)
+    with open(file_path, 'w') as file:
+        file.write(''.join(sections))
+
+
+def docs_files():
+    return sorted(os.listdir('docs'))
+
+
+def test_old_parts_and_code_scripts_are_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_big_file('big.py')
+    
+    mindoc.make_docs(['big.py'], print_production=False, cache_dir='cache', options={'split_size': 4000, 'lazy_code': True})
+    assert 'big-2.html' in docs_files()
+    assert 'big.code.js' in docs_files()
+    
+    mindoc.make_docs(['big.py'], print_production=False, cache_dir='cache', options={})
+    assert docs_files() == ['big.html']
+
+
+def test_first_page_sends_links_on_to_moved_headers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_big_file('big.py')
+    
+    mindoc.make_docs(['big.py'], print_production=False, options={'split_size': 4000})
+    
+    with open(os.path.join('docs', 'big.html')) as file:
+        first_page = file.read()
+    moved_ids = json.loads(re.search(r'var mindocMovedIds = (\{.*?\}),', first_page).group(1))
+    assert moved_ids['part_5'] in docs_files()
+    assert moved_ids['part_5'] != 'big.html'
+    assert 'part_1' not in moved_ids
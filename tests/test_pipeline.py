@@ -0,0 +1,61 @@
+import os
+import time
+
+import mindoc
+
+
+def write_sources(count: int) -> list:
+    os.makedirs('src')
+    code_files = []
+    for number in range(count):
+        code_file_path = os.path.join('src', f'file{number}.py')
+        with open(code_file_path, 'w') as file:
+            file.write(f'"""\n# File {number}\n"""\nx = {number}\n')
+        code_files.append(code_file_path)
+    return code_files
+
+
+def test_docs_come_back_in_the_order_of_the_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code_files = write_sources(40)
+    save_doc = mindoc.save_doc
+    
+    def slow_save_doc(doc, pages, options=None):
+        # The first files take the longest to save, so that the later ones are done first
+        if doc['code_file'] in code_files[:3]:
+            time.sleep(0.05)
+        return save_doc(doc, pages, options)
+    
+    monkeypatch.setattr(mindoc, 'save_doc', slow_save_doc)
+    docs = mindoc.make_docs(code_files, print_production=False)
+    assert [doc['code_file'] for doc in docs] == code_files
+    assert sorted(os.listdir('docs')) == sorted(f'file{number}.html' for number in range(40))
+
+
+def test_pages_are_replaced_in_one_step(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    code_files = write_sources(5)
+    mindoc.make_docs(code_files, print_production=False)
+    old_pages = {}
+    for file_name in os.listdir('docs'):
+        with open(os.path.join('docs', file_name)) as file:
+            old_pages[os.path.join('docs', file_name)] = file.read()
+    
+    for code_file_path in code_files:
+        with open(code_file_path, 'a') as file:
+            file.write('y = 2\n')
+    replace = os.replace
+    replaced = []
+    
+    def checked_replace(source, destination):
+        # Until the new page is renamed over it, the old page is still there as it was
+        with open(destination) as file:
+            assert file.read() == old_pages[destination]
+        assert os.path.dirname(source) == os.path.dirname(destination) and source.endswith('.tmp')
+        replaced.append(destination)
+        replace(source, destination)
+    
+    monkeypatch.setattr(os, 'replace', checked_replace)
+    mindoc.make_docs(code_files, print_production=False)
+    assert sorted(replaced) == sorted(old_pages)
+    assert not [file_name for file_name in os.listdir('docs') if file_name.endswith('.tmp')]
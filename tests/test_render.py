@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+import mindoc
+
+CODE = '"""\n# Render\n\n[TOC]\n\n## Part é\n"""\nx = 1\n'
+
+
+def test_render_gives_the_page_headings_and_toc():
+    result = mindoc.render(CODE)
+    assert result.headings == [('Render', 'render', 1), ('Part é', 'part_é', 2)]
+    assert result.toc == mindoc.get_toc_html(result.headings)
+    assert result.toc in result.html
+    assert result.html == mindoc.convert_code(CODE, 'a.py', {})
+
+
+@pytest.mark.parametrize('kind, source', [('sql', '/*\n# Query\n*/\nSELECT 1\n'), ('md', '# Notes\n\nSome text.\n')])
+def test_render_other_kinds(kind, source):
+    result = mindoc.render(source, kind)
+    assert result.headings[0][0] in ('Query', 'Notes')
+
+
+def test_render_rejects_unknown_kinds():
+    with pytest.raises(ValueError):
+        mindoc.render(CODE, 'txt')
+
+
+def test_render_stream_with_text():
+    output_file = io.StringIO()
+    result = mindoc.render_stream(io.StringIO(CODE), output_file=output_file)
+    assert output_file.getvalue() == result.html == mindoc.render(CODE).html
+
+
+def test_render_stream_with_bytes():
+    output_file = io.BytesIO()
+    result = mindoc.render_stream(io.BytesIO(CODE.encode('utf-8')), output_file=output_file)
+    assert output_file.getvalue() == result.html.encode('utf-8')
+    assert result.html == mindoc.render(CODE).html
+
+
+def test_render_stream_without_an_output_file():
+    assert mindoc.render_stream(io.BytesIO(CODE.encode('utf-8'))).html == mindoc.render(CODE).html
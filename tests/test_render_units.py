@@ -0,0 +1,137 @@
+"""
+Converting the markdown of a file unit by unit, with or without the cache, has to give exactly the same html
+and the same headers as converting the whole file at once.
+
+The documents are made up at random from pieces that are known to cross the line between a documentation
+block and the code block after it: lists, fences and html blocks that are not closed, setext headers,
+link definitions and so on.
+"""
+import itertools
+import random
+
+import pytest
+
+import mindoc
+
+DOC_PIECES = [
+    '# Header {n}',
+    '## Header {n}',
+    '#### Header {n}\n',
+    '##### Deep header {n}',
+    'Header {n}\n========',
+    'Header {n}\n--------',
+    'Some text with *emphasis*, `code` and a [reference {n}].',
+    'A paragraph\nthat goes on\nover three lines.',
+    '* item {n}\n* another item',
+    '1. first\n2. second',
+    '* item {n}\n\n    indented in the item',
+    '> quoted {n}\n> more',
+    '    indented code {n}',
+    '```python\nprint({n})\n```',
+    '```\nnot closed {n}',
+    '~~~\nnot closed either',
+    '<div>\nhtml {n}\n</div>',
+    '<div>not closed {n}',
+    '<!-- a comment {n} -->',
+    '<!-- not closed',
+    '<br>',
+    '| a | b |\n|---|---|\n| {n} | 2 |',
+    '[link {n}]: http://example.com/{n}',
+    'See [link {n}] and a footnote[^{n}].',
+    '[^{n}]: The footnote.',
+    '$x^{n}$ and \\\\(y\\\\)',
+    '```mermaid\ngraph LR\n    A-->B{n}\n```',
+    '[TOC]',
+    '***',
+    '',
+]
+
+CODE_PIECES = [
+    'x = {n}',
+    'def f():\n    """\n    Docstring {n}\n    """\n    return {n}',
+    "s = '''\n# not a header {n}\n'''",
+    '# a comment {n}',
+    'print("```")',
+    '    indented = {n}',
+    '',
+    'if x:\n\n    y = [{n}]\n',
+]
+
+
+def make_doc_block(rng: random.Random) -> str:
+    return '\n\n'.join(rng.choice(DOC_PIECES).format(n=rng.randrange(10)) for _ in range(rng.randrange(1, 5)))
+
+
+def make_code_block(rng: random.Random) -> str:
+    return '\n'.join(rng.choice(CODE_PIECES).format(n=rng.randrange(10)) for _ in range(rng.randrange(1, 4)))
+
+
+def make_blocks(rng: random.Random) -> list:
+    blocks = []
+    for _ in range(rng.randrange(1, 8)):
+        blocks += [make_doc_block(rng), make_code_block(rng)]
+    return blocks
+
+
+def join_python(blocks: list) -> str:
+    return '"""\n' + '\n"""\n'.join(blocks) + '\n'
+
+
+def convert(pre_html: str, flags: tuple, by_units: bool, block_cache_file_name: str = None) -> tuple:
+    markdown = mindoc.get_markdown()
+    markdown.renderer.reset(*flags)
+    if by_units:
+        html = mindoc.render_units(markdown, pre_html, block_cache_file_name)
+    else:
+        html = markdown(pre_html)
+    return (html, list(markdown.renderer.header_list))
+
+
+FLAGS = list(itertools.product([False, True], repeat=3))
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_units_give_the_same_html_as_the_whole_file(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        pre_html = mindoc.convert_python_blocks(join_python(make_blocks(rng)))
+        flags = rng.choice(FLAGS)
+        assert convert(pre_html, flags, by_units=True) == convert(pre_html, flags, by_units=False)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_units_give_the_same_html_after_an_edit(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        blocks = make_blocks(rng)
+        flags = rng.choice(FLAGS)
+        # The first conversion fills the cache, which the second one then mostly comes from
+        convert(mindoc.convert_python_blocks(join_python(blocks)), flags, by_units=True)
+        number = rng.randrange(len(blocks))
+        blocks[number] = make_doc_block(rng) if number % 2 == 0 else make_code_block(rng)
+
+        pre_html = mindoc.convert_python_blocks(join_python(blocks))
+        assert convert(pre_html, flags, by_units=True) == convert(pre_html, flags, by_units=False)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_units_give_the_same_html_for_sql(seed):
+    rng = random.Random(seed)
+    for _ in range(10):
+        code = '/*\n' + make_doc_block(rng) + '\n*/\n' + make_code_block(rng).replace('"""', '')
+        pre_html = mindoc.convert_sql_blocks(code)
+        flags = rng.choice(FLAGS)
+        assert convert(pre_html, flags, by_units=True) == convert(pre_html, flags, by_units=False)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_units_give_the_same_html_from_the_block_cache(seed, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(seed)
+    for number in range(10):
+        pre_html = mindoc.convert_python_blocks(join_python(make_blocks(rng)))
+        flags = rng.choice(FLAGS)
+        convert(pre_html, flags, by_units=True, block_cache_file_name=f'{number}.json')
+        # As in the next build, where only the saved units are there
+        mindoc.rendered_units.clear()
+        assert convert(pre_html, flags, True, f'{number}.json') == convert(pre_html, flags, by_units=False)
@@ -0,0 +1,41 @@
+import os
+
+import mindoc
+
+
+def read_bytes(file_path):
+    with open(file_path, 'rb') as file:
+        return file.read()
+
+
+def test_unchanged_file_is_not_written_again(tmp_path):
+    file_path = str(tmp_path / 'docs' / 'a.html')
+    assert mindoc.save_as('<p>é</p>\n', file_path)
+    inode = os.stat(file_path).st_ino
+    
+    assert not mindoc.save_as('<p>é</p>\n', file_path)
+    assert os.stat(file_path).st_ino == inode
+    assert read_bytes(file_path) == '<p>é</p>\n'.replace('\n', os.linesep).encode('utf-8')
+
+
+def test_changed_file_of_the_same_size_is_written(tmp_path):
+    file_path = str(tmp_path / 'a.html')
+    mindoc.save_as('<p>a</p>', file_path)
+    assert mindoc.save_as('<p>b</p>', file_path)
+    assert read_bytes(file_path) == b'<p>b</p>'
+
+
+def test_file_that_is_not_utf8_is_replaced(tmp_path):
+    file_path = str(tmp_path / 'a.html')
+    with open(file_path, 'wb') as file:
+        file.write(b'\xff\xfe<p>')
+    assert mindoc.save_as('<p>a</p>', file_path)
+    assert read_bytes(file_path) == b'<p>a</p>'
+
+
+def test_bytes_are_saved_as_they_are(tmp_path):
+    file_path = str(tmp_path / 'a.html.gz')
+    assert mindoc.save_as(b'\x1f\x8b\n\xff', file_path)
+    assert not mindoc.save_as(b'\x1f\x8b\n\xff', file_path)
+    assert read_bytes(file_path) == b'\x1f\x8b\n\xff'
+    assert os.listdir(str(tmp_path)) == ['a.html.gz']
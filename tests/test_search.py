@@ -0,0 +1,50 @@
+import json
+import os
+
+import mindoc
+
+
+def write(file_path, content):
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def read_shard(letter):
+    with open(os.path.join('site', mindoc.SEARCH_DIR, f'{letter}.js')) as file:
+        script = file.read()
+    prefix = f'mindocSearch.add("{letter}", '
+    assert script.startswith(prefix) and script.endswith(');\n')
+    return json.loads(script[len(prefix):-len(');\n')])
+
+
+def shard_letters():
+    return sorted(os.listdir(os.path.join('site', mindoc.SEARCH_DIR)))
+
+
+def test_shards_list_the_docs_of_each_term(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('alpha.py', '"""\n# Alpha\n"""\nshared_value = 1\n')
+    write('beta.py', '"""\n# Beta\n"""\nshared_value = 2\n')
+    
+    mindoc.make_docs(['alpha.py', 'beta.py'], print_production=False, options={'index': 'site'})
+    
+    shard = read_shard('s')
+    assert shard['shared_value'] == [0, 1]
+    assert shard['shared'] == [0, 1]
+    assert read_shard('a')['alpha'] == [0]
+    assert read_shard('b')['beta'] == [1]
+    with open(os.path.join('site', 'index.html')) as file:
+        index_page = file.read()
+    assert '../docs/alpha.html' in index_page and 'Beta' in index_page
+
+
+def test_stale_shards_are_removed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('alpha.py', '"""\n# Alpha\n"""\nzebra = 1\n')
+    mindoc.make_docs(['alpha.py'], print_production=False, cache_dir='cache', options={'index': 'site'})
+    assert 'z.js' in shard_letters()
+    
+    write('alpha.py', '"""\n# Alpha\n"""\nx = 1\n')
+    mindoc.make_docs(['alpha.py'], print_production=False, cache_dir='cache', options={'index': 'site'})
+    assert 'z.js' not in shard_letters()
+    assert 'zebra' not in json.dumps(read_shard('a'))
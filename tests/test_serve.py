@@ -0,0 +1,60 @@
+import http.client
+import http.server
+import os
+import threading
+
+import pytest
+
+import mindoc
+
+CODE = '"""\n# A\n\nSome </body> text\n\n```mermaid\ngraph LR\n    A-->B\n```\n"""\nx = 1\n'
+
+
+def write(file_path, content):
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # The vendor folder is outside the folder being served
+    write(str(tmp_path / 'vendor' / 'mermaid' / 'mermaid.min.js'), '// mermaid')
+    write(str(tmp_path / 'secret.txt'), 'secret')
+    os.makedirs(str(tmp_path / 'project'))
+    monkeypatch.chdir(tmp_path / 'project')
+    write('a.py', CODE)
+
+    server = mindoc.mix_in(mindoc.DocServer, http.server.ThreadingHTTPServer)(('127.0.0.1', 0), ['a.py'], {'offline': str(tmp_path / 'vendor')})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path: str) -> tuple:
+    connection = http.client.HTTPConnection(*server.server_address)
+    connection.request('GET', path)
+    response = connection.getresponse()
+    result = (response.status, response.read())
+    connection.close()
+    return result
+
+
+def test_vendor_files_are_served_from_outside_the_folder(server):
+    assert get(server, f'/{mindoc.VENDOR_DIR}/mermaid/mermaid.min.js') == (200, b'// mermaid')
+    assert get(server, f'/docs/{mindoc.VENDOR_DIR}/mermaid/mermaid.min.js') == (200, b'// mermaid')
+    assert get(server, f'/{mindoc.VENDOR_DIR}/mermaid/missing.js')[0] == 404
+
+
+@pytest.mark.parametrize('path', ['../secret.txt', '%2e%2e/secret.txt', 'mermaid/../../secret.txt', '%2Fetc%2Fpasswd'])
+def test_vendor_paths_cannot_leave_the_vendor_folder(server, path):
+    assert get(server, f'/{mindoc.VENDOR_DIR}/{path}')[0] == 404
+
+
+def test_live_reload_goes_before_the_last_end_of_body(server):
+    (status, html) = get(server, next(iter(server.docs)))
+    html = html.decode('utf-8')
+    assert status == 200
+    assert html.index(mindoc.LIVE_RELOAD_SCRIPT) > html.index('Some </body> text')
+    assert html.rstrip().endswith(mindoc.endtag('body') + mindoc.endtag('html'))
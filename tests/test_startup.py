@@ -0,0 +1,21 @@
+"""
+mindoc --help and a build where nothing changed must not import the modules mindoc only imports when it needs them.
+The timings are left to benchmarks/startup.py.
+"""
+import subprocess
+import sys
+
+from benchmarks.startup import LAZY_MODULES, MINDOC, SMALL_FILE, imported_modules
+
+
+def test_help_imports_no_lazy_module(tmp_path):
+    modules = imported_modules([MINDOC, '--help'], str(tmp_path))
+    assert [module for module in LAZY_MODULES if module in modules] == []
+
+
+def test_up_to_date_build_imports_no_lazy_module(tmp_path):
+    (tmp_path / 'small.py').write_text(SMALL_FILE, encoding='utf-8')
+    subprocess.run([sys.executable, MINDOC, 'small.py'], cwd=str(tmp_path), capture_output=True, check=True)
+
+    modules = imported_modules([MINDOC, 'small.py'], str(tmp_path))
+    assert [module for module in LAZY_MODULES if module in modules] == []
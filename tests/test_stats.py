@@ -0,0 +1,51 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import mindoc
+
+MINDOC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mindoc.py')
+
+
+def write_sources():
+    for file_name in ['a.py', 'b.sql']:
+        with open(file_name, 'w') as file:
+            file.write('"""\n# A\n\n[TOC]\n"""\nx = 1\n' if file_name.endswith('.py') else '/*\n# B\n*/\nSELECT 1\n')
+    return ['a.py', 'b.sql']
+
+
+def test_every_doc_is_timed_for_every_stage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    docs = mindoc.make_docs(write_sources(), print_production=False)
+    for doc in docs:
+        assert sorted(doc['seconds']) == sorted(mindoc.STAGES)
+        assert all(seconds >= 0 for seconds in doc['seconds'].values())
+
+
+def test_stats_files_have_every_stage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    docs = mindoc.make_docs(write_sources(), print_production=False)
+    columns = ['code_file', 'html_file', 'code_size', 'html_size'] + mindoc.STAGES
+    
+    mindoc.save_stats(docs, 'stats.json')
+    with open('stats.json') as file:
+        rows = json.load(file)
+    assert [list(row) for row in rows] == [columns, columns]
+    
+    mindoc.save_stats(docs, 'stats.csv')
+    with open('stats.csv', newline='') as file:
+        reader = csv.DictReader(file)
+        assert reader.fieldnames == columns
+        assert [row['code_file'] for row in reader] == ['a.py', 'b.sql']
+
+
+def test_stats_are_printed_for_every_stage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_sources()
+    output = subprocess.run([sys.executable, MINDOC, '--no-cache', '--stats', 'a.py', 'b.sql'], cwd=str(tmp_path),
+                            capture_output=True, text=True, check=True).stdout
+    time_per_stage = output.split('Time per stage:')[1].split()
+    for stage in mindoc.STAGES + ['total']:
+        assert stage in time_per_stage
@@ -0,0 +1,34 @@
+import re
+
+import mindoc
+
+
+def convert(doc: str) -> str:
+    return mindoc.convert_code(f'"""\n{doc}\n"""\nx = 1\n', 'a.py', {})
+
+
+def links(html: str) -> list:
+    return re.findall(r'<a style="color: #555; text-decoration: none;" href="#([^"]+)">([^<]*)</a>', html)
+
+
+def test_every_reference_is_linked_to_its_own_header():
+    html = convert('[TOC]\n\n# Part\n\n## Part one\n\n## Part one two\n\nSee [Part one two], [Part one] and [Part].')
+    assert links(html) == [('part_one_two', 'Part one two'), ('part_one', 'Part one'), ('part', 'Part')]
+
+
+def test_replace_all_prefers_the_longest_string():
+    replacements = {'[a]': '1', '[a] [b]': '2', '[b]': '3'}
+    assert mindoc.replace_all('[a] [b] [b] [a]', replacements) == '2 3 1'
+    assert mindoc.replace_all('[a]', {}) == '[a]'
+
+
+def test_headers_with_inline_code_and_emphasis():
+    html = convert('[TOC]\n\n# The `render()` function\n\n## Some *emphasis*\n\nSee [The render() function] and [Some emphasis].')
+    assert '<h1 id="the_render()_function">The <code>render()</code> function</h1>' in html
+    assert '<a style="color: #333; " href="#the_render()_function">The render() function</a>' in html
+    assert '<a style="color: #333; " href="#some_emphasis">Some emphasis</a>' in html
+    assert links(html) == [('the_render()_function', 'The render() function'), ('some_emphasis', 'Some emphasis')]
+
+
+def test_header_strings_are_the_text_of_the_header():
+    assert mindoc.get_header_string('The <code>a &lt; b</code> &amp; <em>c</em>') == 'The a < b & c'
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import mindoc
+
+FILES = ['a.py', 'top.py', 'keep.sql', 'drop.sql', 'notes.txt', 'build/b.py', 'node_modules/n.py', '.hidden/h.py',
+         'src/c.py', 'src/top.py', 'src/test_c.py', 'src/sub/d.py', 'src/sub/e.md']
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('.git')
+    for file_path in FILES:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        with open(file_path, 'w') as file:
+            file.write('x = 1\n')
+    with open('.gitignore', 'w') as file:
+        file.write('# built files\nbuild/\n*.sql\n!keep.sql\n/top.py\n')
+    with open(os.path.join('src', 'sub', '.gitignore'), 'w') as file:
+        file.write('d.py\n')
+
+
+def find(src_paths, filters=None) -> list:
+    return [os.path.normpath(code_file_path).replace(os.sep, '/') for code_file_path in mindoc.find_code_files(src_paths, filters)]
+
+
+def test_gitignore_files_are_followed(project):
+    assert find(['.']) == ['a.py', 'keep.sql', 'src/c.py', 'src/test_c.py', 'src/top.py', 'src/sub/e.md']
+
+
+def test_gitignore_can_be_turned_off(project):
+    assert find(['.'], {'gitignore': False}) == ['a.py', 'drop.sql', 'keep.sql', 'top.py', 'build/b.py',
+                                                'src/c.py', 'src/test_c.py', 'src/top.py', 'src/sub/d.py', 'src/sub/e.md']
+
+
+def test_gitignore_of_the_folders_above_counts(project):
+    assert find(['src/sub']) == ['src/sub/e.md']
+
+
+
+def test_files_given_by_name_are_only_excluded_by_the_options(project):
+    assert find(['drop.sql', 'keep.sql']) == ['drop.sql', 'keep.sql']
+    assert find(['drop.sql', 'keep.sql'], {'exclude': ['drop.*']}) == ['keep.sql']
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'exclude': ['src/test_*.py']}, ['a.py', 'keep.sql', 'src/c.py', 'src/top.py', 'src/sub/e.md']),
+    ({'exclude': ['src/']}, ['a.py', 'keep.sql']),
+    ({'exclude': ['*.py', '!src/c.py']}, ['keep.sql', 'src/c.py', 'src/sub/e.md']),
+    ({'include': ['src/**']}, ['src/c.py', 'src/test_c.py', 'src/top.py', 'src/sub/e.md']),
+    ({'include': ['*.md', '*.sql']}, ['keep.sql', 'src/sub/e.md']),
+])
+def test_include_and_exclude(project, filters, expected):
+    assert find(['.'], filters) == expected
+
+
+def test_patterns_and_duplicates(project):
+    assert find(['src/**/*.md']) == ['src/sub/e.md']
+    assert find(['src/*.py']) == ['src/c.py', 'src/test_c.py', 'src/top.py']
+    assert find(['src', 'src/c.py', 'a.py', './a.py']) == ['src/c.py', 'src/test_c.py', 'src/top.py', 'src/sub/e.md', 'a.py']
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import mindoc
+
+
+@pytest.fixture
+def watcher():
+    watcher = mindoc.InotifyWatcher.create()
+    if watcher is None:
+        pytest.skip('inotify is not available')
+    yield watcher
+    os.close(watcher.inotify_fd)
+
+
+def read_all_events(watcher) -> bool:
+    changed = False
+    while watcher.read_events(0.2):
+        changed = True
+    return changed
+
+
+def test_recreated_folder_is_watched_again(tmp_path, watcher):
+    sub_dir = str(tmp_path / 'sub')
+    os.mkdir(sub_dir)
+    watcher.add_dirs({sub_dir})
+    
+    os.rmdir(sub_dir)
+    os.mkdir(sub_dir)
+    read_all_events(watcher)
+    assert sub_dir not in watcher.watched_dirs
+    
+    watcher.add_dirs({sub_dir})
+    with open(os.path.join(sub_dir, 'a.sql'), 'w') as file:
+        file.write('SELECT 1')
+    assert read_all_events(watcher)
+
+
+def test_moved_folder_is_watched_again(tmp_path, watcher):
+    sub_dir = str(tmp_path / 'sub')
+    os.mkdir(sub_dir)
+    watcher.add_dirs({str(tmp_path), sub_dir})
+    
+    os.rename(sub_dir, str(tmp_path / 'moved'))
+    assert read_all_events(watcher)
+    assert sub_dir not in watcher.watched_dirs
@@ -0,0 +1,46 @@
+import os
+
+import mindoc
+
+
+def write(file_path, content):
+    with open(file_path, 'w') as file:
+        file.write(content)
+
+
+def read(file_path):
+    with open(file_path) as file:
+        return file.read()
+
+
+def test_references_are_linked_to_other_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a.py', '"""\n# value\n"""\nvalue = 1\n')
+    write('b.py', '"""\n# Using it\n\nSee [value].\n"""\nprint(1)\n')
+    
+    mindoc.make_docs(['a.py', 'b.py'], print_production=False, options={'xref': True})
+    
+    assert 'href="a.html#value">value</a>' in read(os.path.join('docs', 'b.html'))
+
+
+def test_square_brackets_in_code_are_left_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a.py', '"""\n# value\n"""\nvalue = 1\n')
+    write('b.py', '"""\n# Using it\n"""\nprint(row[value])\n')
+    
+    mindoc.make_docs(['a.py', 'b.py'], print_production=False, options={'xref': True})
+    
+    html = read(os.path.join('docs', 'b.html'))
+    assert 'print(row[value])' in html
+    assert 'a.html#value' not in html
+
+
+def test_square_brackets_in_code_are_left_alone_with_a_table_of_contents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write('a.py', '"""\n[TOC]\n\n# value\n"""\nprint(row[value])\n')
+    
+    mindoc.make_docs(['a.py'], print_production=False, options={'xref': True})
+    
+    html = read(os.path.join('docs', 'a.html'))
+    assert 'Table of Contents' in html
+    assert 'print(row[value])' in html